@@ -0,0 +1,157 @@
+"""Benchmarks for the faster paths in this package. Not part of the library API.
+
+Run with: python -m treasure.benchmarks [name ...]
+With no names, every benchmark runs. Inputs are generated in temporary files where needed.
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from .config import LoadConfigFile, SnapshotPath
+from .filesystem import GenerateHash
+from .text import EscapeQuotes, RemoveNonAscii
+
+
+def FastestRun(function, repeat):
+    """Runs function repeat times.
+
+    Returns: The elapsed time of the fastest run in seconds.
+
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def Throughput(size, seconds):
+    """Converts a size in bytes (or characters) and a time into MiB/s."""
+    return size / (1 << 20) / seconds if seconds else float("inf")
+
+
+def BenchmarkGenerateHash(path=None, size=1 << 28, algorithm="sha1", modes=("read", "readinto", "mmap"), repeat=3):
+    """Measures the throughput of each GenerateHash read mode.
+
+    Args:
+        path (): The file to hash. Pass None to generate a temporary file of the given size.
+        size (): Size in bytes of the generated file.
+        algorithm (): Name of any algorithm supported by hashlib.
+        modes (): The GenerateHash modes to compare.
+        repeat (): Number of runs per mode. The fastest run is reported.
+
+    Returns: Dictionary of mode to throughput in MiB/s.
+
+    """
+    generated = path is None
+    if generated:
+        handle, path = tempfile.mkstemp()
+        with os.fdopen(handle, "wb") as f:
+            chunk = os.urandom(1 << 20)
+            for _ in range(size // len(chunk)):
+                f.write(chunk)
+            f.write(chunk[: size % len(chunk)])
+
+    try:
+        file_size = os.path.getsize(path)
+        return {
+            mode: Throughput(
+                file_size, FastestRun(lambda: GenerateHash(path, algorithm, mode=mode), repeat)
+            )
+            for mode in modes
+        }
+    finally:
+        if generated:
+            os.remove(path)
+
+
+def BenchmarkTextFilters(sizes=(1 << 10, 1 << 20, 100 << 20), baseline_limit=1 << 20, repeat=3):
+    """Measures the throughput of RemoveNonAscii and EscapeQuotes on generated text.
+
+    The previous character at a time RemoveNonAscii is included as a baseline, for sizes up to baseline_limit.
+
+    Args:
+        sizes (): Sizes in characters of the generated inputs.
+        baseline_limit (): Largest size the baseline is run on, since it is very slow on large inputs.
+        repeat (): Number of runs per measurement. The fastest run is reported.
+
+    Returns: Dictionary of size to a dictionary of name to throughput in MiB/s of characters.
+
+    """
+
+    def Baseline(text):
+        newString = ""
+        for char in text:
+            if ord(char) <= 255:
+                newString = newString + char
+        return newString
+
+    sample = "Some 'quoted' and \"double quoted\" text with ünïcødé ✓ symbols. "
+    results = {}
+    for size in sizes:
+        text = (sample * (size // len(sample) + 1))[:size]
+        functions = {"RemoveNonAscii": RemoveNonAscii, "EscapeQuotes": EscapeQuotes}
+        if size <= baseline_limit:
+            functions["RemoveNonAscii baseline"] = Baseline
+        results[size] = {
+            name: Throughput(size, FastestRun(lambda: function(text), repeat))
+            for name, function in functions.items()
+        }
+    return results
+
+
+def BenchmarkFetchConfig(path=None, tables=2000, repeat=20):
+    """Compares the time taken to load a config file by parsing it and through its compiled snapshot.
+
+    Args:
+        path (): The config file to load. Pass None to generate a temporary file.
+        tables (): Number of tables in the generated file.
+        repeat (): Number of loads per method. The fastest load is reported.
+
+    Returns: Dictionary of method ('parse' or 'compiled') to seconds per load.
+
+    """
+    generated = path is None
+    if generated:
+        handle, path = tempfile.mkstemp(suffix=".toml")
+        with os.fdopen(handle, "w") as f:
+            for i in range(tables):
+                f.write(f'[table{i}]\nname = "item {i}"\ncount = {i}\nratio = {i / 7}\n')
+                f.write(f'enabled = {"true" if i % 2 else "false"}\ntags = ["a", "b", "c"]\n\n')
+
+    try:
+        LoadConfigFile(path, compiled=True)
+        return {
+            method: FastestRun(lambda: LoadConfigFile(path, compiled), repeat)
+            for method, compiled in (("parse", False), ("compiled", True))
+        }
+    finally:
+        if generated:
+            snapshot = SnapshotPath(path)
+            os.remove(path)
+            if snapshot is not None:
+                try:
+                    os.remove(snapshot)
+                except FileNotFoundError:
+                    pass
+
+
+BENCHMARKS = {
+    "hash": BenchmarkGenerateHash,
+    "text": BenchmarkTextFilters,
+    "config": BenchmarkFetchConfig,
+}
+
+
+def main(names=None):
+    """Runs the named benchmarks (every one if names is empty) and prints their results."""
+    for name in names or BENCHMARKS:
+        print(f"{name}: {BENCHMARKS[name]()}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
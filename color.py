@@ -1,3 +1,175 @@
+from array import array
+import contextlib
+import contextvars
+import functools
+
+
+# Approximate RGB values of the 3 bit colors (codes 30 to 37), as xterm displays them
+RGB_3_BIT = (
+    (0, 0, 0),
+    (205, 0, 0),
+    (0, 205, 0),
+    (205, 205, 0),
+    (0, 0, 238),
+    (205, 0, 205),
+    (0, 205, 205),
+    (229, 229, 229),
+)
+
+# Channel levels of the 6x6x6 color cube in the 8 bit palette (codes 16 to 231)
+CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+
+# Nearest cube level index for every channel value. The cube is separable, so the nearest cube
+# color is found one channel at a time.
+CUBE_INDEX = bytes(
+    min(range(6), key=lambda i: abs(CUBE_LEVELS[i] - value)) for value in range(256)
+)
+
+# Nearest step of the grayscale ramp in the 8 bit palette (codes 232 to 255, levels 8 to 238) for
+# every sum of the three channels. The nearest gray is the one closest to the mean of the channels.
+GRAY_INDEX = bytes(
+    min(range(24), key=lambda i: abs(3 * (8 + 10 * i) - total)) for total in range(766)
+)
+
+
+def Distance(a, b):
+    """ Squared distance between two RGB colors. """
+
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def Nearest8BitColor(rgb) -> int:
+    """ Finds the closest color in the 8 bit palette with table lookups, rather than searching the palette.
+
+    The 16 system colors (codes 0 to 15) are skipped, since terminals are free to redefine them.
+
+    Args:
+        rgb: Tuple of (red, green, blue), each from 0 to 255.
+
+    Returns: The 8 bit color code.
+    """
+
+    r, g, b = rgb
+    ri, gi, bi = CUBE_INDEX[r], CUBE_INDEX[g], CUBE_INDEX[b]
+    cube = (CUBE_LEVELS[ri], CUBE_LEVELS[gi], CUBE_LEVELS[bi])
+
+    gray_index = GRAY_INDEX[r + g + b]
+    level = 8 + 10 * gray_index
+    if Distance(rgb, (level, level, level)) < Distance(rgb, cube):
+        return 232 + gray_index
+    return 16 + 36 * ri + 6 * gi + bi
+
+
+@functools.lru_cache(maxsize=1 << 12)
+def QuantizeRGB(rgb) -> tuple:
+    """ Finds the closest 3 bit and 8 bit colors to an RGB color. Results are cached, since the
+    same few colors tend to be requested over and over (such as the cells of a heat map).
+
+    Args:
+        rgb: Tuple of (red, green, blue), each from 0 to 255.
+
+    Returns: Tuple of (3 bit code, 8 bit code, rgb), in the same form as the values of ColoredText.colors.
+    """
+
+    rgb = tuple(rgb)
+    nearest = min(range(8), key=lambda i: Distance(rgb, RGB_3_BIT[i]))
+    return (30 + nearest, Nearest8BitColor(rgb), rgb)
+
+
+def HexColor(rgb):
+    """ Converts an (r, g, b) tuple into a hex color string, such as "#ff8000".
+
+    Returns: The hex color, or None if rgb is not a valid RGB color.
+    """
+
+    try:
+        return "#" + bytes(rgb).hex() if len(rgb) == 3 else None
+    except (ValueError, TypeError):
+        return None
+
+
+@functools.lru_cache(maxsize=1 << 12)
+def ParseHexColor(color:str):
+    """ Converts a hex color, such as "#ff8000" or "#f80", into its definition. See QuantizeRGB.
+
+    Returns: The definition, or None if color is not a valid hex color.
+    """
+
+    digits = color[1:] if color.startswith("#") else None
+    if digits is None or len(digits) not in (3, 6):
+        return None
+    if len(digits) == 3:
+        digits = "".join(digit * 2 for digit in digits)
+    try:
+        rgb = bytes.fromhex(digits)
+    except ValueError:
+        return None
+    # fromhex skips whitespace, so digits such as "f f" decode to fewer bytes
+    if len(rgb) != 3:
+        return None
+    return QuantizeRGB(tuple(rgb))
+
+
+def EscapeSequences(definition, mode:int) -> tuple:
+    """ Builds the ANSI escape sequences for a color definition.
+
+    Args:
+        definition: Tuple of (3 bit code, 8 bit code) with an optional rgb tuple at the end.
+        mode: The bit mode: 3, 8 or 24. Definitions without an RGB value use 8 bit sequences in 24 bit mode.
+
+    Returns: Tuple of (start, end, definition). See ColoredText.Escape.
+    """
+
+    if mode == 24 and len(definition) > 2:
+        r, g, b = definition[2]
+        return (f"\033[38;2;{r};{g};{b}m", "\033[39;49m", definition)
+
+    index = 0 if mode == 3 else 1
+
+    prefix = ("\033[", "\033[38:5:")
+    suffix = ("m", "m")
+    default = ("\033[0m", "\033[39;49m")
+
+    # Entire ansi sequence for colored text
+    ansi_string = f"{prefix[index]}{definition[index]}{suffix[index]}"
+
+    return (ansi_string, default[index], definition)
+
+
+@functools.lru_cache(maxsize=1 << 12)
+def HexEscape(color:str, mode:int):
+    """ Builds the ANSI escape sequences for a hex color. Results are cached in a bounded cache, so
+    rendering many distinct colors (such as a heat map) cannot grow memory without limit.
+
+    Returns: Tuple of (start, end, definition), or None if color is not a valid hex color.
+    """
+
+    definition = ParseHexColor(color)
+    if definition is None:
+        return None
+    return EscapeSequences(definition, mode)
+
+
+class ColorSettings:
+
+    """ Color settings for a single rendering context. See ColoredText.Rendering.
+
+    Attributes:
+        enable_color: Toggles color output
+        use_8_bit_colors: Toggles using 8 bit colors instead of 3 bit colors.
+        use_24_bit_colors: Toggles using 24 bit (truecolor) sequences for colors that have an RGB value.
+        toggles: Specific toggles that can toggle colors off
+    """
+
+    __slots__ = ("enable_color", "use_8_bit_colors", "use_24_bit_colors", "toggles")
+
+    def __init__(self, enable_color:bool, use_8_bit_colors:bool, use_24_bit_colors:bool, toggles:dict):
+        self.enable_color = enable_color
+        self.use_8_bit_colors = use_8_bit_colors
+        self.use_24_bit_colors = use_24_bit_colors
+        self.toggles = toggles
+
+
 class ColoredText:
 
     """ Stores text that is colored.
@@ -6,9 +178,19 @@ class ColoredText:
         colors: Definitions of colors that are supported.
         enable_color: Toggles color output
         use_8_bit_colors: Toggles using 8 bit colors instead of 3 bit colors.
+        use_24_bit_colors: Toggles using 24 bit (truecolor) sequences for colors that have an RGB value.
+            Takes priority over use_8_bit_colors, which remains the fallback for colors without one.
         toggles: Specific toggles that can toggle colors off
+        escapes: Cache of (color, bit mode) to the escape sequences for that color. See Escape.
+        settings: Context variable holding the settings in use. Outside of a Rendering block, this is
+            the ColoredText class itself, so the class attributes above apply.
+
+    Besides the keys of colors, a color may be a hex string such as "#ff8000", or an (r, g, b) tuple.
+    These are matched to the nearest 3 and 8 bit colors when truecolor is not in use.
     """
 
+    __slots__ = ("text", "color", "toggle")
+
     colors = {
         "blue": (34, 4),
         "bright_yellow": (33, 11),
@@ -27,9 +209,14 @@ class ColoredText:
 
     enable_color = True
     use_8_bit_colors = True
+    use_24_bit_colors = False
 
     toggles = {}
 
+    escapes = {}
+
+    settings = contextvars.ContextVar("settings")
+
     def PrintPossibleColors():
         """ Prints a table of all possible colors in b oth 3 and 8 bit modes """
 
@@ -47,19 +234,82 @@ class ColoredText:
     def PrintAllColors():
         """ Prints out every color in the colors dictionary. Text is key and is in its defined color. """
 
-        print(f"Using {'8' if ColoredText.use_8_bit_colors else '3'} bit colors.")
+        settings = ColoredText.settings.get(ColoredText)
+        print(f"Using {'24' if settings.use_24_bit_colors else '8' if settings.use_8_bit_colors else '3'} bit colors.")
         for key in ColoredText.colors.keys():
             print(ColoredText(key,key))
 
     def SetToggleCategory(toggle:str, value:bool=True):
-        """ Creates a new toggle category or updates an existing one.
+        """ Creates a new toggle category or updates an existing one. Inside a Rendering block, only
+        the toggles of that block are changed.
 
         Args:
             toggle: The category to create. Stored as a key in the ColoredText.toggles dict
             value: The value to set the toggle category to.
         """
         
-        ColoredText.toggles |= {toggle:value}
+        ColoredText.settings.get(ColoredText).toggles |= {toggle:value}
+
+    @contextlib.contextmanager
+    def Rendering(enable_color:bool=None, use_8_bit_colors:bool=None, use_24_bit_colors:bool=None, toggles:dict=None):
+        """ Overrides color settings for the current context (thread or asyncio task) only.
+
+        Settings that are not given are inherited from the enclosing settings. The toggles are copied,
+        so SetToggleCategory inside the block does not affect other contexts. Threads and asyncio tasks
+        started elsewhere keep their own settings, so they can render at the same time.
+
+            with ColoredText.Rendering(enable_color=False):
+                log.write(str(text))
+
+        Args:
+            enable_color: Toggles color output
+            use_8_bit_colors: Toggles using 8 bit colors instead of 3 bit colors.
+            use_24_bit_colors: Toggles using 24 bit colors for colors that have an RGB value.
+            toggles: Toggle values to add to (or replace in) the inherited toggles.
+
+        Yields: The ColorSettings in use within the block.
+        """
+
+        current = ColoredText.settings.get(ColoredText)
+        settings = ColorSettings(
+            current.enable_color if enable_color is None else enable_color,
+            current.use_8_bit_colors if use_8_bit_colors is None else use_8_bit_colors,
+            current.use_24_bit_colors if use_24_bit_colors is None else use_24_bit_colors,
+            current.toggles | (toggles or {}),
+        )
+        token = ColoredText.settings.set(settings)
+        try:
+            yield settings
+        finally:
+            ColoredText.settings.reset(token)
+
+    def DefineColor(name:str, rgb):
+        """ Adds a color to ColoredText.colors from an RGB value, with its nearest 3 and 8 bit colors as fallbacks.
+
+        Args:
+            name: The key to store the color under.
+            rgb: Tuple of (red, green, blue), each from 0 to 255, or a hex string such as "#ff8000".
+
+        Raises: ValueError if rgb is not a valid color.
+        """
+
+        # Tuples go through HexColor, which checks every channel is an integer from 0 to 255
+        color = rgb if isinstance(rgb, str) else HexColor(rgb)
+        definition = None if color is None else ParseHexColor(color.strip().lower())
+        if definition is None:
+            raise ValueError(f"Invalid color: {rgb}")
+        ColoredText.colors |= {name.strip().lower():definition}
+
+    def Definition(color:str):
+        """ Finds the definition of a color, either from ColoredText.colors or by parsing a hex color.
+
+        Returns: Tuple of (3 bit code, 8 bit code) with an optional rgb tuple at the end. None if color is not defined.
+        """
+
+        definition = ColoredText.colors.get(color)
+        if definition is None and color is not None and color.startswith("#"):
+            return ParseHexColor(color)
+        return definition
 
     def __init__(self, text:str, color:str, toggle:str=None):
         """ Sets up the text with its color.
@@ -70,8 +320,7 @@ class ColoredText:
             toggle: An optional string corresponding to a key in ColoredText.toggles to enable additional checking as to whether to print in color.
         """
         
-        self.status = {}
-        self.SetText(text)
+        self.text = text
         self.SetColor(color)
         self.SetToggle(toggle)
 
@@ -84,6 +333,16 @@ class ColoredText:
         """
         return self.status
 
+    @property
+    def status(self)->dict:
+        """ Whether the text, color, and toggle are valid. Built when requested, rather than stored on every instance. """
+
+        return {
+            "text": True,
+            "color": ColoredText.Definition(self.color) is not None,
+            "toggle": None if self.toggle is None else True,
+        }
+
     def SetText(self, text:str)->bool:
         """ Sets the text attribute
 
@@ -95,7 +354,6 @@ class ColoredText:
         """
 
         self.text = text
-        self.status |= {"text":True}
         return True
 
 
@@ -103,27 +361,27 @@ class ColoredText:
         """ Sets which color the text will be displayed in.
 
         Args:
-            color: Should be a string corresponding to a key in ColoredText.colors
+            color: Should be a string corresponding to a key in ColoredText.colors, a hex color, or an (r, g, b) tuple
 
-        Returns: True on success. False if color is not a valid key in ColoredText.colors.
+        Returns: True on success. False if color is not a valid key in ColoredText.colors or a valid RGB color.
             
         """
 
+        if isinstance(color, tuple):
+            color = HexColor(color)
+
         status = False
         try:
             self.color = color.strip().lower()
             status = True
 
             # Checks if color is defined
-            try:
-                ColoredText.colors[self.color]
-            except KeyError:
+            if ColoredText.Definition(self.color) is None:
                 status = False
 
         except (ValueError, AttributeError):
             self.color = None
 
-        self.status |= {"color":status}
         return status
 
 
@@ -150,7 +408,6 @@ class ColoredText:
         else:
             self.toggle = None
 
-        self.status |= {"toggle":status}
         return status
 
 
@@ -161,12 +418,13 @@ class ColoredText:
             
         """
 
-        if not ColoredText.enable_color:
+        settings = ColoredText.settings.get(ColoredText)
+        if not settings.enable_color:
             return False
 
         if self.toggle is not None:
             try:
-                return ColoredText.toggles[self.toggle]
+                return settings.toggles[self.toggle]
             except KeyError:
                 return False
 
@@ -184,27 +442,44 @@ class ColoredText:
         if not self.WillPrintColors():
             return str(self.text)
 
-        index = 1 if ColoredText.use_8_bit_colors else 0
+        escape = ColoredText.Escape(self.color)
 
-        prefix = ("\033[", "\033[38:5:")
-        suffix = ("m", "m")
-        default = ("\033[0m", "\033[39;49m")
+        # Color is not defined, so return text unchanged
+        if escape is None:
+            return str(self.text)
 
-        color_string = ""
-        ansi_string = ""
+        return f"{escape[0]}{self.text}{escape[1]}"
 
-        # Attempts to retrieve color from dictionary
-        try:
-            color_string = ColoredText.colors[self.color][index]
+    def Escape(color:str):
+        """ Returns the ANSI escape sequences for a color in the current bit mode.
 
-        # Color is not defined, so return text unchanged
-        except KeyError:
-            return str(self.text)
+        Sequences of named colors are cached per (color, bit mode) in ColoredText.escapes. A cached
+        entry is rebuilt when the definition of the color in ColoredText.colors has been replaced, or
+        ColoredText.colors itself has been. Hex colors are cached separately, in the bounded cache of
+        HexEscape. In 24 bit mode, colors without an RGB value use the 8 or 3 bit sequences instead.
+
+        Args:
+            color: A key in ColoredText.colors, or a hex color
 
-        # Entire ansi sequence for colored text
-        ansi_string = f"{prefix[index]}{color_string}{suffix[index]}"
+        Returns: Tuple of (start, end, definition), where start and end are the escape sequences placed around the text. None if color is not defined.
+            
+        """
 
-        return f"{ansi_string}{self.text}{default[index]}"
+        settings = ColoredText.settings.get(ColoredText)
+        mode = 24 if settings.use_24_bit_colors else 8 if settings.use_8_bit_colors else 3
+        definition = ColoredText.colors.get(color)
+        if definition is None:
+            if color is not None and color.startswith("#"):
+                return HexEscape(color, mode)
+            return None
+
+        cached = ColoredText.escapes.get((color, mode))
+        if cached is not None and cached[2] is definition:
+            return cached
+
+        cached = EscapeSequences(definition, mode)
+        ColoredText.escapes[(color, mode)] = cached
+        return cached
 
 
     def __str__(self):
@@ -238,3 +513,215 @@ class ColoredText:
     def __ne__(self,other):
         return self.text != other.text
 
+
+
+class ColoredTextArray:
+
+    """ Stores many colored texts in columns, instead of as individual ColoredText objects.
+
+    Colors and toggles are stored as small indexes into shared tables, so each row costs little more
+    than its text. Rendering a row gives exactly the same string as str() of the equivalent ColoredText.
+
+    Attributes:
+        texts: List of the text of each row.
+        color_indexes: Array of indexes into color_names for each row.
+        toggle_indexes: Array of indexes into toggle_names for each row.
+        color_names: Table of the distinct (normalized) colors used. May contain None for invalid colors.
+        toggle_names: Table of the distinct toggles used. Index 0 is always None (no toggle).
+    """
+
+    __slots__ = ("texts", "color_indexes", "toggle_indexes", "color_names", "toggle_names", "color_lookup", "toggle_lookup")
+
+    def __init__(self, rows=None):
+        """ Creates the array.
+
+        Args:
+            rows: Optional iterable of ColoredText objects, or of (text, color, toggle) tuples, to add.
+        """
+
+        self.texts = []
+        self.color_indexes = array("I")
+        self.toggle_indexes = array("I")
+        self.color_names = []
+        self.toggle_names = [None]
+        self.color_lookup = {}
+        self.toggle_lookup = {None: 0}
+        if rows is not None:
+            self.Extend(rows)
+
+    def NormalizeColor(color):
+        """ Normalizes a color the same way as ColoredText.SetColor.
+
+        Returns: The stripped, lowercase color, or None if color is not a string.
+        """
+
+        if isinstance(color, tuple):
+            return HexColor(color)
+        try:
+            return color.strip().lower()
+        except (ValueError, AttributeError):
+            return None
+
+    def Append(self, text, color, toggle=None):
+        """ Adds a row.
+
+        Args:
+            text: The text to display.
+            color: The string corresponding to a key in ColoredText.colors.
+            toggle: An optional string corresponding to a key in ColoredText.toggles.
+        """
+
+        self.AppendNormalized(
+            text,
+            ColoredTextArray.NormalizeColor(color),
+            None if toggle is None else str(toggle),
+        )
+
+    def AppendNormalized(self, text, color, toggle):
+        """ Adds a row whose color and toggle have already been normalized. """
+
+        color_index = self.color_lookup.get(color)
+        if color_index is None:
+            color_index = len(self.color_names)
+            self.color_names.append(color)
+            self.color_lookup[color] = color_index
+
+        toggle_index = self.toggle_lookup.get(toggle)
+        if toggle_index is None:
+            toggle_index = len(self.toggle_names)
+            self.toggle_names.append(toggle)
+            self.toggle_lookup[toggle] = toggle_index
+
+        self.texts.append(text)
+        self.color_indexes.append(color_index)
+        self.toggle_indexes.append(toggle_index)
+
+    def Extend(self, rows):
+        """ Adds many rows.
+
+        Args:
+            rows: Iterable of ColoredText objects, or of (text, color) or (text, color, toggle) tuples.
+        """
+
+        for row in rows:
+            if isinstance(row, ColoredText):
+                self.AppendNormalized(row.text, row.color, row.toggle)
+            else:
+                self.Append(*row)
+
+    def Take(self, indexes):
+        """ Creates a new array from the rows at the given indexes, sharing the color and toggle tables.
+
+        Args:
+            indexes: Iterable of row indexes, in the order they should appear.
+
+        Returns: The new ColoredTextArray.
+        """
+
+        result = ColoredTextArray()
+        result.color_names = self.color_names
+        result.toggle_names = self.toggle_names
+        result.color_lookup = self.color_lookup
+        result.toggle_lookup = self.toggle_lookup
+        texts = self.texts
+        color_indexes = self.color_indexes
+        toggle_indexes = self.toggle_indexes
+        for i in indexes:
+            result.texts.append(texts[i])
+            result.color_indexes.append(color_indexes[i])
+            result.toggle_indexes.append(toggle_indexes[i])
+        return result
+
+    def Filter(self, predicate):
+        """ Keeps only the rows whose text satisfies predicate.
+
+        Args:
+            predicate: Function that takes the text of a row and returns True to keep it.
+
+        Returns: A new ColoredTextArray.
+        """
+
+        return self.Take(i for i, text in enumerate(self.texts) if predicate(text))
+
+    def Sorted(self, reverse=False):
+        """ Sorts the rows by text, with the same ordering as sorting ColoredText objects.
+
+        Args:
+            reverse: Pass True to sort in descending order.
+
+        Returns: A new ColoredTextArray.
+        """
+
+        texts = self.texts
+        return self.Take(sorted(range(len(texts)), key=texts.__getitem__, reverse=reverse))
+
+    def Sort(self, reverse=False):
+        """ Sorts the rows in place. See Sorted. """
+
+        result = self.Sorted(reverse)
+        self.texts = result.texts
+        self.color_indexes = result.color_indexes
+        self.toggle_indexes = result.toggle_indexes
+
+    def Escapes(self):
+        """ Looks up the escape sequences for every color in the color table once.
+
+        Returns: Tuple of (list of escape tuples per color index, list of whether to color per toggle index).
+        An escape tuple is None where the text is not colored.
+        """
+
+        settings = ColoredText.settings.get(ColoredText)
+        if not settings.enable_color:
+            return ([None] * len(self.color_names), [False] * len(self.toggle_names))
+
+        escapes = [ColoredText.Escape(color) for color in self.color_names]
+        toggles = [True] + [
+            settings.toggles.get(toggle, False) for toggle in self.toggle_names[1:]
+        ]
+        return (escapes, toggles)
+
+    def Render(self, separator="\n"):
+        """ Renders every row in a single pass.
+
+        Args:
+            separator: The text placed between rows.
+
+        Returns: The rows joined by separator. Each row is identical to str() of the equivalent ColoredText.
+        """
+
+        escapes, toggles = self.Escapes()
+        return separator.join(
+            f"{escapes[c][0]}{text}{escapes[c][1]}"
+            if toggles[t] and escapes[c] is not None
+            else str(text)
+            for text, c, t in zip(self.texts, self.color_indexes, self.toggle_indexes)
+        )
+
+    def Strings(self):
+        """ Renders every row.
+
+        Returns: List of strings, one per row.
+        """
+
+        escapes, toggles = self.Escapes()
+        return [
+            f"{escapes[c][0]}{text}{escapes[c][1]}"
+            if toggles[t] and escapes[c] is not None
+            else str(text)
+            for text, c, t in zip(self.texts, self.color_indexes, self.toggle_indexes)
+        ]
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.Take(range(*index.indices(len(self.texts))))
+        color = self.color_names[self.color_indexes[index]]
+        text = ColoredText(self.texts[index], color or "", self.toggle_names[self.toggle_indexes[index]])
+        text.color = color
+        return text
+
+    def __iter__(self):
+        for i in range(len(self.texts)):
+            yield self[i]
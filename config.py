@@ -2,6 +2,15 @@ import tomllib
 import platform
 from pathlib import Path
 import os
+import sys
+import marshal
+import hashlib
+import datetime
+import tempfile
+import threading
+import time
+from collections.abc import Mapping
+from types import MappingProxyType
 from .filesystem import CreateDirectories
 
 
@@ -42,20 +51,722 @@ def CreateConfig(contents, filename, directory_name):
     return True
 
 
-def FetchConfig(filename, directory_name):
+def FetchConfig(filename, directory_name, compiled=False):
+    """Reads and parses a config file from the default config location.
+
+    Args:
+        filename (): Name of the config file.
+        directory_name (): Name of the directory in the default config location.
+        compiled (): Pass True to load the parsed config from a snapshot when the file is unchanged,
+            rather than parsing it again. See LoadConfigFile.
+
+    Returns: The parsed config, or None if the file does not exist.
+
+    """
     dir = DefaultConfigPath(directory_name)
     if dir is None:
         print("system not detected")
         return None
 
     path = dir / Path(filename)
+    return LoadConfigFile(path, compiled)[1]
+
+
+# Changes whenever the layout of snapshot files changes, so old snapshots are ignored
+SNAPSHOT_VERSION = 2
+
+# Name of the directory (see DefaultConfigPath) holding the private snapshot directory
+SNAPSHOT_DIRECTORY_NAME = "treasure"
+
+
+def SnapshotDirectory(create=False):
+    """Finds the private directory that compiled snapshots are kept in.
+
+    Snapshots are only ever read from a directory owned by the current user that nobody else can
+    write to, never from beside the config file. A config may sit in a project checkout or other
+    shared location, and loading a snapshot planted there would trust whoever wrote it.
+
+    Args:
+        create (): Pass True to create the directory if it does not exist.
+
+    Returns: The directory, or None if it does not exist or is not private.
+
+    """
+    base = DefaultConfigPath(SNAPSHOT_DIRECTORY_NAME)
+    if base is None:
+        return None
+    dir = base / "snapshots"
     try:
-        with path.open() as f:
-            content = f.read()
-            x = tomllib.loads(content)
-        return x
-    except FileNotFoundError:
+        if create:
+            os.makedirs(dir, mode=0o700, exist_ok=True)
+        stat = os.stat(dir)
+    except OSError:
+        return None
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+        return None
+    return dir
+
+
+def SnapshotPath(path, create=False):
+    """Location of the compiled snapshot of a config file, named by a hash of its absolute path.
+
+    Returns: The path, or None if there is no private snapshot directory. See SnapshotDirectory.
+
+    """
+    dir = SnapshotDirectory(create)
+    if dir is None:
+        return None
+    key = hashlib.sha256(os.fsencode(os.path.abspath(path))).hexdigest()
+    return dir / f"{key}.snapshot"
+
+
+# Tags of the TOML date and time types, which marshal cannot store. TOML never produces tuples,
+# so a tagged tuple can not be confused with a value.
+TIME_TYPES = {
+    datetime.datetime: "datetime",
+    datetime.date: "date",
+    datetime.time: "time",
+}
+TIME_PARSERS = {tag: kind.fromisoformat for kind, tag in TIME_TYPES.items()}
+
+
+def PackTimes(value):
+    """Replaces dates and times in a parsed config with (tag, ISO format) tuples, so marshal can store them."""
+    if isinstance(value, dict):
+        return {k: PackTimes(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [PackTimes(v) for v in value]
+    tag = TIME_TYPES.get(type(value))
+    if tag is not None:
+        return (tag, value.isoformat())
+    return value
+
+
+def UnpackTimes(value):
+    """Reverses PackTimes."""
+    if isinstance(value, dict):
+        return {k: UnpackTimes(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [UnpackTimes(v) for v in value]
+    if isinstance(value, tuple):
+        return TIME_PARSERS[value[0]](value[1])
+    return value
+
+
+def ReadSnapshot(path, signature):
+    """Loads the compiled snapshot of a config file.
+
+    Args:
+        path (): Location of the config file.
+        signature (): (mtime_ns, size) of the config file as it is now.
+
+    Returns: The config stored in the snapshot, or None if the snapshot is missing, stale or corrupt.
+
+    """
+    snapshot = SnapshotPath(path)
+    if snapshot is None:
+        return None
+    try:
+        with open(snapshot, "rb") as f:
+            data = f.read()
+        # Marshal is fastest to load, and unlike pickle it never runs code while loading
+        header, packed, config = marshal.loads(data)
+        if header != (
+            SNAPSHOT_VERSION,
+            sys.implementation.cache_tag,
+            os.path.abspath(path),
+            *signature,
+        ):
+            return None
+        if packed:
+            config = UnpackTimes(config)
+    except Exception:
         return None
+    return config if isinstance(config, dict) else None
+
+
+def WriteSnapshot(path, signature, config):
+    """Stores the compiled snapshot of a config file. Failures are ignored, since the snapshot is only a cache.
+
+    Args:
+        path (): Location of the config file.
+        signature (): (mtime_ns, size) of the config file when it was parsed.
+        config (): The parsed config.
+
+    Returns: True if the snapshot was written.
+
+    """
+    snapshot = SnapshotPath(path, create=True)
+    if snapshot is None:
+        return False
+
+    header = (SNAPSHOT_VERSION, sys.implementation.cache_tag, os.path.abspath(path), *signature)
+    try:
+        data = marshal.dumps((header, False, config))
+    except ValueError:
+        # Only configs containing dates and times pay for converting them
+        data = marshal.dumps((header, True, PackTimes(config)))
+
+    try:
+        # Written to a temporary file first, so a concurrent reader never sees half a snapshot
+        handle, temporary = tempfile.mkstemp(dir=snapshot.parent, prefix=snapshot.name)
+        try:
+            with os.fdopen(handle, "wb") as f:
+                f.write(data)
+            os.replace(temporary, snapshot)
+        except BaseException:
+            os.remove(temporary)
+            raise
+    except OSError:
+        return False
+    return True
+
+
+def LoadConfigFile(path, compiled=False):
+    """Reads and parses a config file, optionally through its compiled snapshot.
+
+    Snapshots are kept in a private directory (see SnapshotDirectory). A snapshot is only used when
+    the mtime and size of the file match the ones recorded in it. Stale, corrupt or unreadable
+    snapshots are ignored and replaced after parsing the file.
+
+    Args:
+        path (): Location of the config file.
+        compiled (): Pass True to use and maintain the snapshot.
+
+    Returns: Tuple of ((mtime_ns, size), config). Both are None if the file does not exist.
+
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return (None, None)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    if compiled:
+        config = ReadSnapshot(path, signature)
+        if config is not None:
+            return (signature, config)
+
+    try:
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    except FileNotFoundError:
+        return (None, None)
+
+    if compiled:
+        WriteSnapshot(path, signature, config)
+    return (signature, config)
+
+
+class ConfigHandle:
+
+    """ Keeps a parsed config file in memory, re-parsing it only when the file changes.
+
+    The file is considered changed when its mtime or size differs from when it was last parsed.
+    Get checks this at most once every check_interval seconds, or a watcher thread started with
+    Watch can do the checking instead, so lookups in hot paths cost no file access at all.
+    If a changed file fails to parse, the last good config is kept and the error is stored.
+
+    Attributes:
+        path: Location of the config file.
+        check_interval: Minimum number of seconds between checks of the file in Get. Pass None to
+            only check through Reload or a watcher thread.
+        config: The parsed config, or None if the file does not exist.
+        signature: (mtime_ns, size) of the file when it was parsed, or None if it does not exist.
+        error: The exception raised by the last failed reload (or by a callback run by the watcher
+            thread), or None.
+        callbacks: Functions called with the new config whenever it changes.
+        compiled: Whether the config is loaded through its compiled snapshot.
+    """
+
+    def __init__(self, filename, directory_name, check_interval=1.0, compiled=False):
+        """ Parses the config file for the first time.
+
+        Args:
+            filename: Name of the config file.
+            directory_name: Name of the directory in the default config location. See DefaultConfigPath.
+            check_interval: Minimum number of seconds between checks of the file in Get.
+            compiled: Pass True to load the config through its compiled snapshot. See LoadConfigFile.
+        """
+
+        dir = DefaultConfigPath(directory_name)
+        self.path = None if dir is None else dir / Path(filename)
+        self.check_interval = check_interval
+        self.compiled = compiled
+        self.config = None
+        self.signature = None
+        self.error = None
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.last_check = time.monotonic()
+        self.watcher = None
+        self.stop_watching = threading.Event()
+        if self.path is None:
+            print("system not detected")
+            return
+
+        self.signature, self.config = self.Parse()
+
+    def Signature(self):
+        """ Returns (mtime_ns, size) of the config file, or None if it does not exist. """
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def Parse(self):
+        """ Reads and parses the config file.
+
+        Returns: Tuple of (signature, config). Both are None if the file does not exist.
+        """
+
+        return LoadConfigFile(self.path, self.compiled)
+
+    def Reload(self, force=False):
+        """ Re-parses the config file if it has changed, then calls the callbacks if the config changed.
+
+        Args:
+            force: Pass True to re-parse even if the file appears unchanged.
+
+        Returns: True if the config changed.
+        """
+
+        if self.path is None:
+            return False
+
+        with self.lock:
+            self.last_check = time.monotonic()
+            # A file being replaced mid-save can fail to stat, read or decode, so every such failure
+            # keeps the last good config until the next check
+            try:
+                if not force and self.Signature() == self.signature:
+                    return False
+                signature, config = self.Parse()
+            except (tomllib.TOMLDecodeError, UnicodeDecodeError, OSError) as e:
+                self.error = e
+                return False
+            self.error = None
+            self.signature = signature
+            if config == self.config:
+                return False
+            self.config = config
+            callbacks = list(self.callbacks)
+
+        for callback in callbacks:
+            callback(config)
+        return True
+
+    def Get(self):
+        """ Returns the parsed config, checking the file first if check_interval has passed.
+
+        Returns: The config dict, or None if the file does not exist.
+        """
+
+        if (
+            self.check_interval is not None
+            and time.monotonic() - self.last_check >= self.check_interval
+        ):
+            self.Reload()
+        return self.config
+
+    def OnChange(self, callback):
+        """ Registers a function to be called with the new config whenever it changes.
+
+        Args:
+            callback: Function that takes the new config (None if the file was removed).
+
+        Returns: callback, so this can be used as a decorator.
+        """
+
+        with self.lock:
+            self.callbacks.append(callback)
+        return callback
+
+    def Watch(self, interval=1.0):
+        """ Starts a daemon thread that checks the file every interval seconds. Does nothing if already watching.
+
+        Args:
+            interval: Number of seconds between checks.
+        """
+
+        if self.watcher is not None:
+            return
+        self.stop_watching.clear()
+
+        def Poll():
+            while not self.stop_watching.wait(interval):
+                # The thread must outlive a failing reload or callback, or later changes are never seen
+                try:
+                    self.Reload()
+                except Exception as e:
+                    self.error = e
+
+        self.watcher = threading.Thread(target=Poll, daemon=True)
+        self.watcher.start()
+
+    def StopWatching(self):
+        """ Stops the watcher thread started by Watch, waiting for it to finish. """
+
+        if self.watcher is None:
+            return
+        self.stop_watching.set()
+        self.watcher.join()
+        self.watcher = None
+
+    def __getitem__(self, key):
+        config = self.Get()
+        if config is None:
+            raise KeyError(key)
+        return config[key]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.StopWatching()
+
+
+# Handles shared by FetchConfigCached, keyed by (filename, directory_name)
+config_handles = {}
+config_handles_lock = threading.Lock()
+
+
+def FetchConfigCached(filename, directory_name, check_interval=1.0):
+    """ Like FetchConfig, but serves the config from memory, re-parsing only when the file changes.
+
+    Every caller shares the same parsed config, so it is returned as a read-only view. Unlike the
+    dict from FetchConfig, it cannot be passed to ExtractConfigItem. Use LayeredConfig.Get or a
+    ConfigSchema for defaults instead, or FetchConfig for a private dict.
+
+    Args:
+        filename: Name of the config file.
+        directory_name: Name of the directory in the default config location.
+        check_interval: Minimum number of seconds between checks of the file. Only used the first
+            time a file is fetched.
+
+    Returns: A read-only view (types.MappingProxyType) of the parsed config, or None if the file does
+    not exist. Nested tables are shared as well, so they must not be modified.
+    """
+
+    key = (filename, directory_name)
+    handle = config_handles.get(key)
+    if handle is None:
+        with config_handles_lock:
+            handle = config_handles.get(key)
+            if handle is None:
+                handle = ConfigHandle(filename, directory_name, check_interval)
+                config_handles[key] = handle
+    config = handle.Get()
+    return None if config is None else MappingProxyType(config)
+
+# Marks a key that is missing from a layer, since None cannot appear in TOML
+MISSING = object()
+
+
+class LayeredConfig(Mapping):
+
+    """ Read-only view of several configs (such as system, user and project) merged together.
+
+    Nothing is copied or merged up front. Each lookup goes through the layers from the highest
+    priority down, so large nested tables are only visited where they are actually read. Tables
+    present in several layers are merged key by key, while any other value in a higher layer
+    replaces the value in the layers below it.
+
+    Attributes:
+        layers: The configs, highest priority first.
+    """
+
+    __slots__ = ("layers",)
+
+    def __init__(self, layers, environment_prefix=None, environment=None):
+        """ Creates the view.
+
+        Args:
+            layers: Configs (dicts) from lowest to highest priority. None entries, such as from
+                FetchConfig on a missing file, are skipped.
+            environment_prefix: Pass a prefix such as "APP_" to add environment variables starting
+                with it as the highest priority layer. See EnvironmentLayer.
+            environment: The environment variables to read. Pass None to use os.environ.
+        """
+
+        layers = [layer for layer in layers if layer is not None]
+        if environment_prefix is not None:
+            layers.append(EnvironmentLayer(environment_prefix, environment))
+        self.layers = layers[::-1]
+
+    def View(layers):
+        """ Creates a view over layers that are already ordered highest priority first. """
+
+        view = LayeredConfig.__new__(LayeredConfig)
+        view.layers = layers
+        return view
+
+    def Resolve(layers, key):
+        """ Finds the value of key in layers (highest priority first).
+
+        Returns: The value, a tuple of the tables to merge if the value is a table, or MISSING.
+        TOML never produces tuples, so they cannot be confused with values.
+        """
+
+        tables = ()
+        for layer in layers:
+            value = layer.get(key, MISSING)
+            if value is MISSING:
+                continue
+            if not isinstance(value, dict):
+                # A table in a higher layer hides other values below it
+                return tables or value
+            tables += (value,)
+        return tables or MISSING
+
+    def Get(self, key, default=None):
+        """ Looks up a dotted key, such as "server.port", without creating views along the way.
+
+        Args:
+            key: The key, with a "." between the names of nested tables.
+            default: Returned if the key is missing. Nothing is written into the config.
+
+        Returns: The value. Tables are returned as LayeredConfig views.
+        """
+
+        *tables, name = key.split(".")
+        layers = self.layers
+        for part in tables:
+            layers = LayeredConfig.Resolve(layers, part)
+            if type(layers) is not tuple:
+                return default
+
+        value = LayeredConfig.Resolve(layers, name)
+        if value is MISSING:
+            return default
+        if type(value) is tuple:
+            return LayeredConfig.View(value)
+        return value
+
+    def ToDict(self):
+        """ Merges the layers into a plain nested dict. """
+
+        return {
+            key: value.ToDict() if isinstance(value, LayeredConfig) else value
+            for key, value in self.items()
+        }
+
+    def __getitem__(self, key):
+        value = LayeredConfig.Resolve(self.layers, key)
+        if value is MISSING:
+            raise KeyError(key)
+        if type(value) is tuple:
+            return LayeredConfig.View(value)
+        return value
+
+    def __contains__(self, key):
+        return any(key in layer for layer in self.layers)
+
+    def __iter__(self):
+        # Keys of lower layers first, so keys keep the order of the base config
+        return iter(dict.fromkeys(key for layer in reversed(self.layers) for key in layer))
+
+    def __len__(self):
+        return len(dict.fromkeys(key for layer in self.layers for key in layer))
+
+    def __repr__(self):
+        return f"LayeredConfig({self.ToDict()!r})"
+
+
+def EnvironmentLayer(prefix, environment=None, separator="__"):
+    """Builds a config layer from environment variables. Ex: with prefix "APP_", the variable
+    APP_SERVER__PORT=8080 becomes {"server": {"port": 8080}}.
+
+    Args:
+        prefix (): Only variables starting with this are used. It is removed from the key.
+        environment (): The environment variables to read. Pass None to use os.environ.
+        separator (): Separates the names of nested tables in a variable name.
+
+    Returns: The layer, as a nested dict. Values are parsed as TOML values where possible, and
+    kept as strings otherwise.
+
+    """
+    if environment is None:
+        environment = os.environ
+    layer = {}
+    for name, value in environment.items():
+        if not name.startswith(prefix) or len(name) == len(prefix):
+            continue
+        *tables, key = name[len(prefix) :].lower().split(separator)
+        table = layer
+        for part in tables:
+            table = table.setdefault(part, {})
+            if not isinstance(table, dict):
+                break
+        else:
+            try:
+                table[key] = tomllib.loads(f"value = {value}")["value"]
+            except tomllib.TOMLDecodeError:
+                table[key] = value
+    return layer
+
+
+def FetchLayeredConfig(paths, environment_prefix=None, compiled=False):
+    """Loads several config files into a single LayeredConfig.
+
+    Args:
+        paths (): Locations of the config files, from lowest to highest priority. Missing files are skipped.
+        environment_prefix (): Prefix of environment variables that override the files. See EnvironmentLayer.
+        compiled (): Pass True to load the files through their compiled snapshots. See LoadConfigFile.
+
+    Returns: The LayeredConfig.
+
+    """
+    return LayeredConfig(
+        (LoadConfigFile(path, compiled)[1] for path in paths), environment_prefix
+    )
+
+
+class ConfigError(ValueError):
+
+    """ Raised when a config does not match a ConfigSchema.
+
+    Attributes:
+        errors: Every problem found, as a list of messages.
+    """
+
+    def __init__(self, errors):
+        super().__init__("Invalid config: " + "; ".join(errors))
+        self.errors = errors
+
+
+class ConfigObject:
+
+    """ Base of the classes ConfigSchema creates. Every key in the schema is a slotted attribute. """
+
+    __slots__ = ()
+
+    def ToDict(self):
+        """ Returns a dict of attribute name to value. """
+
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.ToDict() == other.ToDict()
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+class ConfigSchema:
+
+    """ Declares the keys of a config with their types and defaults once, then validates parsed
+    configs into slotted objects in a single pass.
+
+        schema = ConfigSchema({"server.port": (int, 8080), "server.host": str, "name": (str, None)})
+        settings = schema.Validate(FetchConfig("app.toml", "app"))
+        settings.server_port
+
+    Attributes:
+        fields: Compiled fields, as tuples of (attribute, key, path, types, default).
+        type: The slotted ConfigObject subclass that Validate creates.
+    """
+
+    __slots__ = ("fields", "type")
+
+    def __init__(self, fields, name="Config"):
+        """ Compiles the schema.
+
+        Args:
+            fields: Dict of dotted key (such as "server.port") to either a type, for a required key,
+                or a tuple of (type, default) for an optional key. The type may be a tuple of types.
+                The attribute for a key is its dotted key with "." replaced by "_".
+            name: Name of the created ConfigObject subclass.
+
+        Raises: ValueError if a key cannot be used as an attribute, two keys use the same attribute,
+            or an attribute would hide a member of ConfigObject (such as ToDict).
+        """
+
+        self.fields = []
+        for key, definition in fields.items():
+            if isinstance(definition, tuple) and len(definition) == 2 and not isinstance(definition[1], type):
+                types, default = definition
+            else:
+                types, default = definition, MISSING
+            attribute = key.replace(".", "_").replace("-", "_")
+            if not attribute.isidentifier():
+                raise ValueError(f"Key cannot be used as an attribute: {key}")
+            if hasattr(ConfigObject, attribute):
+                raise ValueError(f"Key clashes with a ConfigObject attribute: {key}")
+            for field in self.fields:
+                if field[0] == attribute:
+                    raise ValueError(f"Keys '{field[1]}' and '{key}' both use the attribute {attribute}")
+            self.fields.append((attribute, key, tuple(key.split(".")), types, default))
+
+        self.type = type(name, (ConfigObject,), {"__slots__": tuple(field[0] for field in self.fields)})
+
+    def Check(value, types):
+        """ Checks a value against the types of a field. Integers are accepted (and converted) where
+        floats are expected, but booleans are never accepted as numbers.
+
+        Returns: The value to store, or MISSING if it has the wrong type.
+        """
+
+        if isinstance(value, types):
+            if isinstance(value, bool) and not (types is bool or isinstance(types, tuple) and bool in types):
+                return MISSING
+            return value
+        if (types is float or isinstance(types, tuple) and float in types) and type(value) is int:
+            return float(value)
+        return MISSING
+
+    def Validate(self, config):
+        """ Validates a config and builds the config object.
+
+        Args:
+            config: The parsed config. Any Mapping works, including a LayeredConfig. None is treated as empty.
+
+        Returns: An instance of self.type with an attribute for every key in the schema.
+
+        Raises: ConfigError listing every missing or invalid key.
+        """
+
+        if config is None:
+            config = {}
+        result = self.type.__new__(self.type)
+        errors = []
+        for attribute, key, path, types, default in self.fields:
+            value = config
+            for part in path:
+                try:
+                    value = value.get(part, MISSING)
+                except AttributeError:
+                    value = MISSING
+                if value is MISSING:
+                    break
+
+            if value is MISSING:
+                if default is MISSING:
+                    errors.append(f"missing key '{key}'")
+                    continue
+                value = default
+            else:
+                checked = ConfigSchema.Check(value, types)
+                if checked is MISSING:
+                    errors.append(f"key '{key}' should be {ConfigSchema.TypeName(types)}, not {type(value).__name__}")
+                    continue
+                value = checked
+            setattr(result, attribute, value)
+
+        if errors:
+            raise ConfigError(errors)
+        return result
+
+    def TypeName(types):
+        """ Describes the types of a field for error messages. """
+
+        if isinstance(types, tuple):
+            return " or ".join(t.__name__ for t in types)
+        return types.__name__
+
 
 def ParseSpecificationString(string,item_separator=";",key_value_separator=":",allow_dict=True):
     try:
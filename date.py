@@ -1,3 +1,33 @@
+# Units used by FormatAge, largest first
+MINUTE = 60
+HOUR = 3600  # 3,600 (60*60)
+DAY = 86400  # 86,400 (60*60*24)
+MONTH = 2592000  # 2,592,000  (60*60*24*30) (30 days in a month)
+YEAR = 31536000  # 31,536,000 (60*60*24*30*365)
+AGE_UNITS = ((YEAR, "year"), (MONTH, "month"), (DAY, "day"), (HOUR, "hour"), (MINUTE, "minute"))
+
+
+def AgeCount(age):
+    """Finds the largest unit that is smaller than age, and how many of that unit fit within age.
+
+    Args:
+        age (): The time in seconds.
+
+    Returns: Tuple of (count, word), or None for ages of 60 seconds or less. count is the number of
+    times the unit can be subtracted while age stays larger than the unit, which is one less than
+    age / unit rounded up. Raises TypeError for non-numeric ages and ValueError for infinite ones.
+
+    """
+    for unit, word in AGE_UNITS:
+        if age > unit:
+            count, remainder = divmod(age, unit)
+            # An exact multiple stops one subtraction early, since age must stay larger than the unit
+            if not remainder:
+                count -= 1
+            return (int(count), word)
+    return None
+
+
 def FormatAge(age, suffix=""):
     """Takes a time (age) in seconds, and returns a string that describes it with the largest unit that
     is smaller than the time. ex: age = 119, returns 'one minute', age = 95000, returns 'one day.'
@@ -12,55 +42,109 @@ def FormatAge(age, suffix=""):
 
     """
 
-    MINUTE = 60
-    HOUR = 3600  # 3,600 (60*60)
-    DAY = 86400  # 86,400 (60*60*24)
-    MONTH = 2592000  # 2,592,000  (60*60*24*30) (30 days in a month)
-    YEAR = 31536000  # 31,536,000 (60*60*24*30*365)
-
     try:
         age + 1
     except TypeError:
         return f"{age}"
 
-    ticker = 0
-    word = ""
-
-    if age > YEAR:  # Years
-        while age > YEAR:
-            age -= YEAR
-            ticker += 1
-        word = "year"
-
-    elif age > MONTH:  # Months
-        while age > MONTH:
-            age -= MONTH
-            ticker += 1
-        word = "month"
-
-    elif age > DAY:  # Days
-        while age > DAY:
-            age -= DAY
-            ticker += 1
-        word = "day"
-
-    elif age > HOUR:  # Hours
-        while age > HOUR:
-            age -= HOUR
-            ticker += 1
-        word = "hour"
-
-    elif age > MINUTE:  # Minutes
-        while age > MINUTE:
-            age -= MINUTE
-            ticker += 1
-        word = "minute"
-
-    else:  # Times less than 60 seconds (1 minute)
+    # Infinite ages can not be described with a count
+    try:
+        result = AgeCount(age)
+    except (ValueError, ArithmeticError):
+        return f"{age}"
+
+    # Times less than 60 seconds (1 minute)
+    if result is None:
         return "just now"
 
+    ticker, word = result
+
     # Need to make word plural
     if ticker > 1:
         word += "s"
 
     return f"{ticker} {word} {suffix}"
+
+
+def FormatAgeBatch(ages, suffix=""):
+    """Formats many ages at once, giving the same strings as FormatAge. Identical outputs share one string object.
+
+    Args:
+        ages (): Sequence (or NumPy array) of times in seconds.
+        suffix (): String to be placed after each time.
+
+    Returns: List of strings.
+
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    if numpy is not None and isinstance(ages, numpy.ndarray) and ages.dtype.kind in "iuf":
+        return FormatAgeArray(numpy, ages, suffix)
+
+    cache = {}
+    results = []
+    for age in ages:
+        try:
+            key = AgeCount(age)
+        except (TypeError, ValueError, ArithmeticError):
+            results.append(FormatAge(age, suffix))
+            continue
+        text = cache.get(key)
+        if text is None:
+            text = FormatAge(age, suffix)
+            cache[key] = text
+        results.append(text)
+    return results
+
+
+def FormatAgeArray(numpy, ages, suffix=""):
+    """NumPy implementation of FormatAgeBatch. Units and counts are selected for the whole array at once.
+
+    Args:
+        numpy (): The numpy module.
+        ages (): Array of integer or floating point times in seconds.
+        suffix (): String to be placed after each time.
+
+    Returns: List of strings.
+
+    """
+    ages = ages.ravel()
+    dtype = numpy.float64 if ages.dtype.kind == "f" else numpy.int64
+    thresholds = numpy.array([unit for unit, _ in reversed(AGE_UNITS)], dtype=dtype)
+
+    # Number of units that are smaller than each age. 0 means just now.
+    index = numpy.searchsorted(thresholds, ages, side="left")
+    if ages.dtype.kind == "f":
+        finite = numpy.isfinite(ages)
+        # NaN sorts to the end, but is not larger than any unit
+        index[numpy.isnan(ages)] = 0
+    else:
+        finite = numpy.ones(len(ages), dtype=bool)
+
+    units = numpy.concatenate((numpy.ones(1, dtype=dtype), thresholds))[index]
+    count, remainder = numpy.divmod(numpy.where(finite, ages, 0), units)
+    # An exact multiple stops one subtraction early, since age must stay larger than the unit
+    count = count - (remainder == 0)
+
+    words = [None] + [word for _, word in reversed(AGE_UNITS)]
+    cache = {}
+    results = []
+    for age, i, n, ok in zip(ages.tolist(), index.tolist(), count.tolist(), finite.tolist()):
+        if i == 0:
+            results.append("just now")
+            continue
+        if not ok:
+            results.append(f"{age}")
+            continue
+        key = (i, n)
+        text = cache.get(key)
+        if text is None:
+            ticker = int(n)
+            word = words[i] + ("s" if ticker > 1 else "")
+            text = f"{ticker} {word} {suffix}"
+            cache[key] = text
+        results.append(text)
+    return results
@@ -1,5 +1,18 @@
 import os
+import gzip
+import json
+import mmap
+import asyncio
+import fnmatch
+import time
+import sqlite3
 import hashlib
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+    FIRST_COMPLETED,
+    wait,
+)
 
 def ImmediateSubDirectories(path):
     return [f.name for f in os.scandir(path) if f.is_dir()]
@@ -7,19 +20,921 @@ def ImmediateSubDirectories(path):
 def AllRegularFiles(path):
     return [f.name for f in os.scandir(path) if f.is_file()]
 
-def GenerateHash(path,algorithm,block_size=65536):
-    if algorithm.strip().lower() == "sha1":
-        hasher = hashlib.sha1()
-        with open(path, 'rb') as f:
+def Walk(path, include=None, exclude=None, max_depth=None, symlinks="skip", yield_directories=False):
+    """Recursively walks a directory, making a single scandir pass per directory.
+
+    Entries are yielded as os.DirEntry objects, which cache their stat data. Files are
+    yielded as they are found and only the names of pending subdirectories are kept,
+    so memory stays flat even on directories with millions of entries.
+
+    Args:
+        path (): The directory to walk.
+        include (): Glob pattern or list of patterns. Only files whose name matches one are yielded.
+            Pass None to yield every file.
+        exclude (): Glob pattern or list of patterns. Files and directories whose name matches one
+            are skipped, and excluded directories are not descended into.
+        max_depth (): How many levels below path to descend. 0 only lists path itself. Pass None for no limit.
+        symlinks (): 'skip' ignores symlinks, 'list' yields them without descending into them and
+            'follow' treats them as the file or directory they point to.
+        yield_directories (): Pass True to also yield directory entries (before their contents).
+
+    Returns: Generator of os.DirEntry objects.
+
+    """
+    if symlinks not in ("skip", "list", "follow"):
+        raise ValueError(f"Unknown symlink policy: '{symlinks}'")
+    if isinstance(include, str):
+        include = [include]
+    if isinstance(exclude, str):
+        exclude = [exclude]
+
+    follow = symlinks == "follow"
+    visited = set()
+    if follow:
+        stat = os.stat(path)
+        visited.add((stat.st_dev, stat.st_ino))
+
+    stack = [(os.fspath(path), 0)]
+    while stack:
+        directory, depth = stack.pop()
+        subdirectories = []
+        try:
+            iterator = os.scandir(directory)
+        except OSError:
+            continue
+        with iterator:
+            for entry in iterator:
+                if exclude and any(fnmatch.fnmatch(entry.name, p) for p in exclude):
+                    continue
+                try:
+                    is_symlink = entry.is_symlink()
+                    if is_symlink and symlinks == "skip":
+                        continue
+                    is_dir = entry.is_dir(follow_symlinks=follow)
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if yield_directories:
+                        yield entry
+                    if max_depth is None or depth < max_depth:
+                        if follow:
+                            # Guards against symlink cycles and directories reached twice
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            key = (stat.st_dev, stat.st_ino)
+                            if key in visited:
+                                continue
+                            visited.add(key)
+                        subdirectories.append(entry.path)
+                    continue
+
+                if include and not any(fnmatch.fnmatch(entry.name, p) for p in include):
+                    continue
+                yield entry
+
+        # Reversed so that subdirectories are walked in the order scandir found them
+        for subdirectory in reversed(subdirectories):
+            stack.append((subdirectory, depth + 1))
+
+class DirectorySummary:
+
+    """ Totals for the regular files within a directory and all of its subdirectories.
+
+    Attributes:
+        files: Number of regular files.
+        bytes: Total size of the files in bytes.
+        newest_mtime: Most recent st_mtime of any file, or None if there are no files.
+    """
+
+    __slots__ = ("files", "bytes", "newest_mtime")
+
+    def __init__(self, files=0, bytes=0, newest_mtime=None):
+        self.files = files
+        self.bytes = bytes
+        self.newest_mtime = newest_mtime
+
+    def Add(self, other):
+        """ Adds the totals of another summary into this one.
+
+        Args:
+            other: The DirectorySummary to add.
+        """
+
+        self.files += other.files
+        self.bytes += other.bytes
+        if other.newest_mtime is not None and (
+            self.newest_mtime is None or other.newest_mtime > self.newest_mtime
+        ):
+            self.newest_mtime = other.newest_mtime
+
+    def __repr__(self):
+        return f"DirectorySummary(files={self.files}, bytes={self.bytes}, newest_mtime={self.newest_mtime})"
+
+def ScanDirectory(path):
+    """Scans a single directory, without descending into it.
+
+    Args:
+        path (): The directory to scan.
+
+    Returns: Tuple of (DirectorySummary of the files directly inside, list of subdirectory paths).
+    Symlinks are not followed and unreadable directories return an empty summary.
+
+    """
+    summary = DirectorySummary()
+    subdirectories = []
+    try:
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        summary.Add(DirectorySummary(1, stat.st_size, stat.st_mtime))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return (summary, subdirectories)
+
+def ScanTree(path, workers=16):
+    """Scans a directory tree, listing sibling directories concurrently on a thread pool.
+
+    Intended for network or other high-latency filesystems, where each scandir call is dominated
+    by waiting instead of cpu, so wall-clock time scales with the number of workers.
+
+    Args:
+        path (): The root of the tree to scan.
+        workers (): Number of directories that may be scanned at the same time.
+
+    Returns: Dictionary of directory path to the DirectorySummary of its entire subtree, including path itself.
+
+    """
+    path = os.fspath(path)
+    own = {}
+    children = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(ScanDirectory, path): path}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory = pending.pop(future)
+                summary, subdirectories = future.result()
+                own[directory] = summary
+                children[directory] = subdirectories
+                for subdirectory in subdirectories:
+                    pending[executor.submit(ScanDirectory, subdirectory)] = subdirectory
+
+    # Rolls each subtree up into its parent, deepest directories first
+    totals = {}
+    order = [path]
+    for directory in order:
+        order.extend(children[directory])
+    for directory in reversed(order):
+        total = DirectorySummary()
+        total.Add(own[directory])
+        for subdirectory in children[directory]:
+            total.Add(totals[subdirectory])
+        totals[directory] = total
+    return totals
+
+async def ScanTreeAsync(path, workers=16):
+    """Asyncio front end for ScanTree. The scan runs on a thread so the event loop is not blocked.
+
+    Args:
+        path (): The root of the tree to scan.
+        workers (): Number of directories that may be scanned at the same time.
+
+    Returns: Same as ScanTree.
+
+    """
+    return await asyncio.to_thread(ScanTree, path, workers)
+
+def CreateSnapshot(path, algorithm=None, previous=None, trust_directory_mtime=False):
+    """Records the size, mtime and optionally digest of every regular file in a tree.
+
+    Args:
+        path (): The root of the tree.
+        algorithm (): Name of a hashlib algorithm to store digests from GenerateHash. Pass None to skip hashing.
+        previous (): An earlier snapshot of the same tree. Digests of files whose size and mtime
+            are unchanged are reused instead of being rehashed.
+        trust_directory_mtime (): Pass True (with previous) to reuse the previous listing of any directory
+            whose mtime has not changed, instead of scanning it. Subdirectories are still checked, so
+            the cost is about one stat per directory. Files rewritten in place (rather than replaced)
+            inside an unchanged directory are not noticed in this mode. Ignored when previous used a
+            different algorithm, since its files must be rehashed anyway.
+
+    Returns: Snapshot dictionary of {'root', 'algorithm', 'directories': {relative path: mtime_ns},
+    'files': {relative path: [size, mtime_ns, digest]}}. Paths use '/' and the root is ''.
+
+    """
+    root = os.fspath(path)
+    snapshot = {"root": root, "algorithm": algorithm, "directories": {}, "files": {}}
+    directories = snapshot["directories"]
+    files = snapshot["files"]
+
+    old_files = {}
+    old_directories = {}
+    old_listing = {}
+    if previous is not None:
+        old_files = previous["files"]
+        old_directories = previous["directories"]
+        same_algorithm = previous.get("algorithm") == algorithm
+        if not same_algorithm:
+            old_files = {k: [v[0], v[1], None] for k, v in old_files.items()}
+        # Reused listings copy the previous entries as they are, so they are only usable
+        # when those entries already hold the digests this snapshot needs
+        if trust_directory_mtime and (same_algorithm or algorithm is None):
+            # Groups the previous snapshot by parent directory, so listings can be reused
+            old_listing = {k: ([], []) for k in old_directories}
+            for k in old_files:
+                old_listing[k.rpartition("/")[0]][0].append(k)
+            for k in old_directories:
+                if k:
+                    old_listing[k.rpartition("/")[0]][1].append(k)
+
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        absolute = os.path.join(root, relative) if relative else root
+        try:
+            mtime = os.stat(absolute).st_mtime_ns
+        except OSError:
+            continue
+        directories[relative] = mtime
+
+        if relative in old_listing and old_directories[relative] == mtime:
+            listed_files, listed_directories = old_listing[relative]
+            for k in listed_files:
+                files[k] = old_files[k]
+            stack.extend(listed_directories)
+            continue
+
+        try:
+            iterator = os.scandir(absolute)
+        except OSError:
+            continue
+        with iterator:
+            for entry in iterator:
+                key = f"{relative}/{entry.name}" if relative else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(key)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                digest = None
+                old = old_files.get(key)
+                if old is not None and old[0] == stat.st_size and old[1] == stat.st_mtime_ns:
+                    digest = old[2]
+                if digest is None and algorithm is not None:
+                    try:
+                        digest = GenerateHash(entry.path, algorithm)
+                    except OSError:
+                        continue
+                files[key] = [stat.st_size, stat.st_mtime_ns, digest]
+
+    return snapshot
+
+def SaveSnapshot(snapshot, path):
+    """Writes a snapshot to a gzip compressed JSON file.
+
+    Args:
+        snapshot (): The snapshot dictionary from CreateSnapshot.
+        path (): The file to write.
+    """
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+
+def LoadSnapshot(path):
+    """Reads a snapshot written by SaveSnapshot.
+
+    Args:
+        path (): The file to read.
+
+    Returns: The snapshot dictionary, or None if the file does not exist.
+
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def DiffSnapshots(old, new):
+    """Compares two snapshots of the same tree.
+
+    A removed file and an added file are reported as a rename when they have the same size and
+    digest, or the same size and mtime if either snapshot has no digests.
+
+    Args:
+        old (): The earlier snapshot.
+        new (): The later snapshot.
+
+    Returns: Dictionary of {'added': [path], 'removed': [path], 'modified': [path], 'renamed': [(old path, new path)]}.
+
+    """
+    old_files = old["files"]
+    new_files = new["files"]
+
+    added = [k for k in new_files if k not in old_files]
+    removed = [k for k in old_files if k not in new_files]
+    modified = []
+    for k, value in new_files.items():
+        previous = old_files.get(k)
+        if previous is None:
+            continue
+        if previous[0] != value[0]:
+            modified.append(k)
+        elif previous[2] is not None and value[2] is not None:
+            if previous[2] != value[2]:
+                modified.append(k)
+        elif previous[1] != value[1]:
+            modified.append(k)
+
+    # Digests identify content only if every candidate has one
+    use_digests = all(old_files[k][2] is not None for k in removed) and all(
+        new_files[k][2] is not None for k in added
+    )
+    field = 2 if use_digests else 1
+    candidates = {}
+    for k in removed:
+        value = old_files[k]
+        identity = (value[0], value[field])
+        candidates.setdefault(identity, []).append(k)
+
+    renamed = []
+    still_added = []
+    for k in added:
+        value = new_files[k]
+        identity = (value[0], value[field])
+        matches = candidates.get(identity)
+        if matches:
+            renamed.append((matches.pop(0), k))
+        else:
+            still_added.append(k)
+
+    renamed_from = {pair[0] for pair in renamed}
+    removed = [k for k in removed if k not in renamed_from]
+
+    return {
+        "added": sorted(still_added),
+        "removed": sorted(removed),
+        "modified": sorted(modified),
+        "renamed": sorted(renamed),
+    }
+
+def NewHasher(algorithm):
+    """Creates a hashlib object for the named algorithm.
+
+    Args:
+        algorithm (): Name of any algorithm supported by hashlib. Ex: 'sha1', 'sha256', 'blake2b'
+
+    Returns: The hash object, or None if the algorithm is not supported. Variable length
+    algorithms (shake_128 and shake_256) are not supported, since their digests need a length.
+
+    """
+    try:
+        hasher = hashlib.new(algorithm.strip().lower())
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return hasher if hasher.digest_size else None
+
+def AdaptiveBlockSize(path, minimum=65536):
+    """Picks a read size that is a whole multiple of the filesystem's preferred block size.
+
+    Args:
+        path (): The file that will be read. May also be an os.stat_result.
+        minimum (): The smallest block size to return.
+
+    Returns: The block size in bytes.
+
+    """
+    stat = path if isinstance(path, os.stat_result) else os.stat(path)
+    preferred = getattr(stat, "st_blksize", 0) or 4096
+    return max(preferred, (minimum + preferred - 1) // preferred * preferred)
+
+def GenerateHash(path,algorithm,block_size=None,mode="readinto",mmap_threshold=1 << 26):
+    """Hashes the entire contents of a file.
+
+    Args:
+        path (): The file to hash.
+        algorithm (): Name of any algorithm supported by hashlib.
+        block_size (): Number of bytes read per call. Pass None to adapt to the filesystem's st_blksize.
+        mode (): 'read' allocates a new bytes object per block, 'readinto' reuses one preallocated
+            buffer, 'mmap' hashes a memory map of the file and 'auto' uses mmap for files of at least
+            mmap_threshold bytes and readinto otherwise. Only use 'mmap' or 'auto' on files that no
+            other process may truncate while they are hashed (such as logs rotated with copytruncate):
+            reading a truncated mapping kills the whole process with SIGBUS instead of raising OSError.
+        mmap_threshold (): Smallest file size that 'auto' mode will memory map.
+
+    Returns: The hex digest, or None if the algorithm or mode is not supported.
+
+    """
+    hasher = NewHasher(algorithm)
+    if hasher is None:
+        return None
+
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if block_size is None:
+            block_size = AdaptiveBlockSize(stat)
+
+        if mode == "auto":
+            mode = "mmap" if stat.st_size >= mmap_threshold else "readinto"
+
+        if mode == "read":
             buf = f.read(block_size)
             while len(buf) > 0:
                 hasher.update(buf)
                 buf = f.read(block_size)
-                return hasher.hexdigest()
 
-    return None
+        elif mode == "readinto":
+            buf = bytearray(block_size)
+            view = memoryview(buf)
+            count = f.readinto(buf)
+            while count:
+                hasher.update(view[:count])
+                count = f.readinto(buf)
 
-def CreateDirectories(dir):
-    dir.mkdir(parents=True, exist_ok=True)
+        elif mode == "mmap":
+            # Empty files can not be memory mapped
+            if stat.st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    with memoryview(mapped) as view:
+                        for start in range(0, len(view), block_size):
+                            hasher.update(view[start : start + block_size])
+
+        else:
+            return None
+
+    return hasher.hexdigest()
+
+def GenerateHashes(paths, algorithm, block_size=None, workers=None, use_processes=False):
+    """Hashes many files across a pool of workers, yielding results as each file finishes.
+
+    Args:
+        paths (): Iterable of paths to hash. Consumed lazily, so it may be a generator.
+        algorithm (): Name of any algorithm supported by hashlib.
+        block_size (): Number of bytes read per call. Pass None to adapt to the filesystem's st_blksize.
+        workers (): Number of workers in the pool. Pass None to use the number of cpus.
+        use_processes (): Pass True to use a process pool instead of a thread pool.
+
+    Returns: Generator of (path, result) tuples in completion order. result is the hex digest
+    on success, or the exception that was raised while hashing that file.
+
+    """
+    if NewHasher(algorithm) is None:
+        raise ValueError(f"Unsupported hash algorithm: '{algorithm}'")
+
+    if workers is None:
+        workers = os.cpu_count() or 1
 
+    # Keeps a few jobs queued per worker so the disks stay busy, without
+    # materializing the whole iterable of paths at once.
+    max_pending = workers * 4
+    executor_type = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
 
+    with executor_type(max_workers=workers) as executor:
+        pending = {}
+        paths = iter(paths)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    path = next(paths)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(GenerateHash, path, algorithm, block_size)
+                pending[future] = path
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                yield (path, result)
+
+def GeneratePartialHash(path, algorithm, size, partial_size=4096):
+    """Hashes only the first and last partial_size bytes of a file.
+
+    Args:
+        path (): The file to hash.
+        algorithm (): Name of any algorithm supported by hashlib.
+        size (): Size of the file in bytes.
+        partial_size (): Number of bytes to read from each end of the file.
+
+    Returns: Tuple of (hex digest, number of bytes read). When the file is no longer than
+    2 * partial_size the whole file is read, so the digest covers its full contents.
+
+    """
+    hasher = NewHasher(algorithm)
+    with open(path, "rb") as f:
+        if size <= 2 * partial_size:
+            data = f.read()
+            hasher.update(data)
+            return (hasher.hexdigest(), len(data))
+        head = f.read(partial_size)
+        f.seek(-partial_size, os.SEEK_END)
+        tail = f.read(partial_size)
+    hasher.update(head)
+    hasher.update(tail)
+    return (hasher.hexdigest(), len(head) + len(tail))
+
+def FindDuplicates(paths, algorithm="sha1", partial_size=4096, min_size=1, stats=None):
+    """Finds files with identical contents, reading as little of each file as possible.
+
+    Files are grouped by size, unique sizes are discarded, the remaining files are compared
+    with a cheap head/tail hash, and only files that still collide are hashed in full.
+
+    Args:
+        paths (): Iterable of file paths, or a directory to Walk.
+        algorithm (): Name of any algorithm supported by hashlib.
+        partial_size (): Number of bytes read from each end of a file for the partial hash.
+        min_size (): Files smaller than this are ignored. Defaults to skipping empty files.
+        stats (): Optional dictionary that is filled with the bytes read by each stage
+            ('size', 'partial', 'full') and the total bytes a naive full hash would read ('naive').
+
+    Returns: Generator of lists of paths. Each list is a group of identical files, yielded as soon as it is confirmed.
+
+    """
+    if NewHasher(algorithm) is None:
+        raise ValueError(f"Unsupported hash algorithm: '{algorithm}'")
+
+    if stats is None:
+        stats = {}
+    stats |= {"size": 0, "partial": 0, "full": 0, "naive": 0}
+
+    if isinstance(paths, (str, os.PathLike)):
+        paths = (entry.path for entry in Walk(paths))
+
+    # Stage 1: Group by size. Only needs a stat of each file.
+    by_size = {}
+    seen = set()
+    for path in paths:
+        path = os.fspath(path)
+        if path in seen:
+            continue
+        seen.add(path)
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            continue
+        if size < min_size:
+            continue
+        stats["naive"] += size
+        by_size.setdefault(size, []).append(path)
+
+    for size, group in by_size.items():
+        # Stage 2: Files with a unique size can not have a duplicate.
+        if len(group) < 2:
+            continue
+
+        # Stage 3: Head/tail hash
+        by_partial = {}
+        for path in group:
+            try:
+                digest, count = GeneratePartialHash(path, algorithm, size, partial_size)
+            except OSError:
+                continue
+            stats["partial"] += count
+            by_partial.setdefault(digest, []).append(path)
+
+        for partial_group in by_partial.values():
+            if len(partial_group) < 2:
+                continue
+
+            # The partial hash already covered the whole file
+            if size <= 2 * partial_size:
+                yield partial_group
+                continue
+
+            # Stage 4: Full hash of the files that still collide
+            by_full = {}
+            for path in partial_group:
+                try:
+                    digest = GenerateHash(path, algorithm)
+                except OSError:
+                    continue
+                stats["full"] += size
+                by_full.setdefault(digest, []).append(path)
+
+            for full_group in by_full.values():
+                if len(full_group) > 1:
+                    yield full_group
+
+def HashChunk(path, index, chunk_size, algorithm, block_size=1 << 20):
+    """Hashes a single fixed-size chunk of a file as a tree-hash leaf.
+
+    Args:
+        path (): The file to read.
+        index (): Which chunk to hash. Chunk i starts at byte i * chunk_size.
+        chunk_size (): Size of each chunk in bytes.
+        algorithm (): Name of any algorithm supported by hashlib.
+        block_size (): Number of bytes read per call within the chunk.
+
+    Returns: The raw (bytes) digest of the leaf.
+
+    """
+    hasher = NewHasher(algorithm)
+    # Leaves and interior nodes are domain separated so one can not pass for the other
+    hasher.update(b"\x00")
+    buf = bytearray(min(block_size, chunk_size))
+    view = memoryview(buf)
+    remaining = chunk_size
+    with open(path, "rb") as f:
+        f.seek(index * chunk_size)
+        while remaining > 0:
+            count = f.readinto(view[: min(remaining, len(buf))])
+            if not count:
+                break
+            hasher.update(view[:count])
+            remaining -= count
+    return hasher.digest()
+
+def MerkleRoot(leaves, algorithm):
+    """Combines leaf digests pairwise into a single root digest.
+
+    Args:
+        leaves (): List of raw (bytes) leaf digests.
+        algorithm (): Name of any algorithm supported by hashlib.
+
+    Returns: The raw (bytes) root digest. An unpaired node is promoted to the next level as-is.
+
+    """
+    if not leaves:
+        hasher = NewHasher(algorithm)
+        hasher.update(b"\x00")
+        return hasher.digest()
+
+    level = list(leaves)
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level) - 1, 2):
+            hasher = NewHasher(algorithm)
+            hasher.update(b"\x01")
+            hasher.update(level[i])
+            hasher.update(level[i + 1])
+            parents.append(hasher.digest())
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+    return level[0]
+
+def GenerateTreeHash(path, algorithm="blake2b", chunk_size=1 << 24, workers=None):
+    """Hashes a single file in fixed-size chunks on a thread pool and combines them into a Merkle root.
+
+    hashlib releases the GIL while hashing large buffers, so the chunks are hashed in parallel.
+    Note that the root is not the same value as GenerateHash would return for the file.
+
+    Args:
+        path (): The file to hash.
+        algorithm (): Name of any algorithm supported by hashlib.
+        chunk_size (): Size of each leaf in bytes.
+        workers (): Number of threads. Pass None to use the number of cpus.
+
+    Returns: Tuple of (root hex digest, list of chunk hex digests), or None if the algorithm is not supported.
+
+    """
+    if NewHasher(algorithm) is None:
+        return None
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    size = os.path.getsize(path)
+    chunks = (size + chunk_size - 1) // chunk_size
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        leaves = list(
+            executor.map(
+                lambda i: HashChunk(path, i, chunk_size, algorithm), range(chunks)
+            )
+        )
+
+    root = MerkleRoot(leaves, algorithm)
+    return (root.hex(), [leaf.hex() for leaf in leaves])
+
+def VerifyTreeHash(path, chunk_digests, algorithm="blake2b", chunk_size=1 << 24, chunks=None, workers=None):
+    """Rehashes chunks of a file and compares them to digests from GenerateTreeHash.
+
+    Args:
+        path (): The file to check.
+        chunk_digests (): The list of chunk hex digests previously returned by GenerateTreeHash.
+        algorithm (): The algorithm used to create chunk_digests.
+        chunk_size (): The chunk size used to create chunk_digests.
+        chunks (): Iterable of chunk indexes to check, such as a region known to have been written.
+            Pass None to check every chunk.
+        workers (): Number of threads. Pass None to use the number of cpus.
+
+    Returns: Sorted list of chunk indexes that no longer match. Chunks added or removed by a
+    change in file size are included. None if the algorithm is not supported.
+
+    """
+    if NewHasher(algorithm) is None:
+        return None
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    size = os.path.getsize(path)
+    current_chunks = (size + chunk_size - 1) // chunk_size
+    total = max(current_chunks, len(chunk_digests))
+    if chunks is None:
+        chunks = range(total)
+
+    changed = set()
+    to_hash = []
+    for i in chunks:
+        if i >= current_chunks or i >= len(chunk_digests):
+            changed.add(i)
+        else:
+            to_hash.append(i)
+
+    # The final chunk may have changed length, even when it is not in chunks
+    if current_chunks != len(chunk_digests):
+        changed.update(range(min(current_chunks, len(chunk_digests)) - 1, total))
+        changed.discard(-1)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        digests = executor.map(
+            lambda i: HashChunk(path, i, chunk_size, algorithm).hex(), to_hash
+        )
+        for i, digest in zip(to_hash, digests):
+            if digest != chunk_digests[i]:
+                changed.add(i)
+
+    return sorted(changed)
+
+class DigestCache:
+
+    """ Persistent cache of file digests stored in a SQLite file.
+
+    A stored digest is reused when the device, inode, size and mtime_ns of the file
+    all still match, so unchanged files only cost a stat. Ex: a cache stored beside
+    the config with DigestCache(DefaultConfigPath("app") / "digests.sqlite")
+
+    Attributes:
+        path: Location of the SQLite file.
+        max_entries: Maximum number of digests kept. The least recently used are evicted first.
+        commit_interval: Number of writes between commits to disk.
+    """
+
+    def __init__(self, path, max_entries=1000000, commit_interval=1000):
+        """ Opens (or creates) the cache file.
+
+        Args:
+            path: Location of the SQLite file. Parent directories are created if needed.
+            max_entries: Maximum number of digests kept in the cache.
+            commit_interval: Number of writes between commits to disk.
+        """
+
+        self.path = path
+        self.max_entries = max_entries
+        self.commit_interval = commit_interval
+        self.pending_writes = 0
+
+        parent = os.path.dirname(os.fspath(path))
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.fspath(path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS digests ("
+            "path TEXT NOT NULL, algorithm TEXT NOT NULL, "
+            "device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, "
+            "digest TEXT NOT NULL, last_used REAL, "
+            "PRIMARY KEY (path, algorithm))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS digests_last_used ON digests (last_used)"
+        )
+        self.entries = self.connection.execute(
+            "SELECT COUNT(*) FROM digests"
+        ).fetchone()[0]
+
+    def GenerateHash(self, path, algorithm, block_size=None):
+        """ Same as filesystem.GenerateHash, but returns the cached digest when the file has not changed.
+
+        Args:
+            path: The file to hash.
+            algorithm: Name of any algorithm supported by hashlib.
+            block_size: Number of bytes read per call when the file must be rehashed. Pass None to adapt to st_blksize.
+
+        Returns: The hex digest, or None if the algorithm is not supported.
+        """
+
+        algorithm = algorithm.strip().lower()
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        signature = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        row = self.connection.execute(
+            "SELECT device, inode, size, mtime_ns, digest FROM digests "
+            "WHERE path = ? AND algorithm = ?",
+            (key, algorithm),
+        ).fetchone()
+
+        if row is not None and tuple(row[:4]) == signature:
+            self.connection.execute(
+                "UPDATE digests SET last_used = ? WHERE path = ? AND algorithm = ?",
+                (time.time(), key, algorithm),
+            )
+            self.Written()
+            return row[4]
+
+        digest = GenerateHash(key, algorithm, block_size)
+        if digest is None:
+            return None
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, algorithm, *signature, digest, time.time()),
+        )
+        if row is None:
+            self.entries += 1
+            if self.entries > self.max_entries:
+                self.Evict()
+        self.Written()
+        return digest
+
+    def Invalidate(self, path=None, algorithm=None):
+        """ Removes entries from the cache, forcing the files to be rehashed.
+
+        Args:
+            path: The file to forget. Pass None to match every file.
+            algorithm: Only forget digests of this algorithm. Pass None to match every algorithm.
+
+        Returns: The number of entries removed.
+        """
+
+        conditions = []
+        values = []
+        if path is not None:
+            conditions.append("path = ?")
+            values.append(os.path.abspath(path))
+        if algorithm is not None:
+            conditions.append("algorithm = ?")
+            values.append(algorithm.strip().lower())
+
+        query = "DELETE FROM digests"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        removed = self.connection.execute(query, values).rowcount
+        self.entries -= removed
+        self.connection.commit()
+        self.pending_writes = 0
+        return removed
+
+    def Evict(self):
+        """ Removes the least recently used entries until the cache is within max_entries. """
+
+        excess = self.entries - self.max_entries
+        if excess <= 0:
+            return
+        self.connection.execute(
+            "DELETE FROM digests WHERE rowid IN "
+            "(SELECT rowid FROM digests ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self.entries -= excess
+
+    def Written(self):
+        """ Records a write, committing once commit_interval writes have accumulated. """
+
+        self.pending_writes += 1
+        if self.pending_writes >= self.commit_interval:
+            self.connection.commit()
+            self.pending_writes = 0
+
+    def Close(self):
+        """ Commits outstanding writes and closes the SQLite file. """
+
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+def CreateDirectories(dir):
+    dir.mkdir(parents=True, exist_ok=True)
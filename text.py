@@ -1,3 +1,46 @@
+import re
+import sys
+import functools
+import itertools
+
+# Characters that str.splitlines() treats as line boundaries
+LINE_BREAKS = frozenset("\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029")
+
+
+# ANSI escape sequences, such as the ones ColoredText produces
+ANSI_PATTERN = re.compile(r"\033\[[0-9;:?]*[ -/]*[@-~]")
+ANSI_RESET = "\033[0m"
+ANSI_RESETS = frozenset(("\033[0m", "\033[m", "\033[39m", "\033[39;49m"))
+
+# Characters used to draw boxes and tables
+PLAIN_BORDERS = {
+    "topLeft": "+",
+    "topRight": "+",
+    "bottomLeft": "+",
+    "bottomRight": "+",
+    "sideLeft": "+",
+    "sideRight": "+",
+    "topJoin": "+",
+    "bottomJoin": "+",
+    "cross": "+",
+    "vertical": "|",
+    "horizontal": "-",
+}
+FANCY_BORDERS = {
+    "topLeft": "┌",
+    "topRight": "┐",
+    "bottomLeft": "└",
+    "bottomRight": "┘",
+    "sideLeft": "├",
+    "sideRight": "┤",
+    "topJoin": "┬",
+    "bottomJoin": "┴",
+    "cross": "┼",
+    "vertical": "│",
+    "horizontal": "─",
+}
+
+
 def EscapeQuotes(text):
     text = text.replace("'","\\'")
     text = text.replace('"','\\"')
@@ -7,50 +50,217 @@ def RemoveNonAscii(text):
     """
     Keeps only the first 256 characters of extended ASCII. Probably bad for portability
     """
-    newString = ""
-    for char in text:
-        if ord(char) <= 255:
-            newString = newString + char
-    return newString
+    # Pure ascii needs no work
+    if text.isascii():
+        return text
+    # latin-1 is exactly the first 256 code points, so the codec drops everything else in one pass
+    return text.encode("latin-1", "ignore").decode("latin-1")
+
+
+def EscapeQuotesBatch(strings):
+    """Applies EscapeQuotes to every string in an iterable.
+
+    Args:
+        strings (): Iterable of strings.
+
+    Returns: Iterator of the escaped strings, in the same order.
+
+    """
+    return map(EscapeQuotes, strings)
+
+
+def RemoveNonAsciiBatch(strings):
+    """Applies RemoveNonAscii to every string in an iterable.
+
+    Args:
+        strings (): Iterable of strings.
+
+    Returns: Iterator of the filtered strings, in the same order.
+
+    """
+    return map(RemoveNonAscii, strings)
+
+
+def TransformStream(source, function, chunk_size=1 << 20):
+    """Applies a per-character text transformation to a large text source in chunks.
+
+    Only valid for functions (like EscapeQuotes and RemoveNonAscii) whose output for a string is the
+    concatenation of their output for any split of that string.
+
+    Args:
+        source (): A file opened in text mode (anything with read()), or an iterable of strings.
+        function (): The transformation to apply to each chunk.
+        chunk_size (): Number of characters read per chunk from a file.
+
+    Returns: Generator of transformed chunks. Joining them gives function applied to the whole text.
+
+    """
+    if hasattr(source, "read"):
+        chunk = source.read(chunk_size)
+        while chunk:
+            yield function(chunk)
+            chunk = source.read(chunk_size)
+    else:
+        for chunk in source:
+            yield function(chunk)
+
+
+def EscapeQuotesStream(source, chunk_size=1 << 20):
+    """Chunked EscapeQuotes for files. See TransformStream."""
+    return TransformStream(source, EscapeQuotes, chunk_size)
+
+
+def RemoveNonAsciiStream(source, chunk_size=1 << 20):
+    """Chunked RemoveNonAscii for files. See TransformStream."""
+    return TransformStream(source, RemoveNonAscii, chunk_size)
+
+
+class OutputSink:
+
+    """ Collects text and passes it on to a writable in large writes.
+
+    Can be passed as the file to any of the Print functions in this module. Text is accumulated
+    until buffer_size characters are pending, then written with a single call.
+
+    Attributes:
+        file: The writable to pass text on to. None keeps all text in memory to be retrieved with getvalue().
+        buffer_size: Number of pending characters that triggers a write.
+    """
+
+    def __init__(self, file=None, buffer_size=1 << 16):
+        """ Creates the sink.
+
+        Args:
+            file: Anything with a write() method, such as a file or StringIO. Pass None to only keep the text in memory.
+            buffer_size: Number of pending characters that triggers a write to file.
+        """
+
+        self.file = file
+        self.buffer_size = buffer_size
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self, text):
+        """ Adds text to the sink, writing it out once enough is pending.
+
+        Args:
+            text: The text to add.
+
+        Returns: The number of characters added.
+        """
+
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.file is not None and self.pending_size >= self.buffer_size:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        """ Writes all pending text to file in a single write. """
+
+        if self.file is None or not self.pending:
+            return
+        self.file.write("".join(self.pending))
+        self.pending = []
+        self.pending_size = 0
+        if hasattr(self.file, "flush"):
+            self.file.flush()
+
+    def getvalue(self):
+        """ Returns the text that has not been written to file yet. When file is None, this is everything written to the sink. """
+
+        if len(self.pending) > 1:
+            self.pending = ["".join(self.pending)]
+        return self.pending[0] if self.pending else ""
+
+    def close(self):
+        """ Writes out any pending text. The underlying file is left open. """
+
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+
+def Write(text, file=None):
+    """Writes text to a file, or to standard output.
+
+    Args:
+        text (): The text to write.
+        file (): Anything with a write() method. Pass None to use sys.stdout.
+    """
+    if file is None:
+        file = sys.stdout
+    file.write(text)
+
+
+def PrintLines(lines, file=None):
+    """Prints a list of lines, such as the result of Enbox, in a single write.
+
+    Args:
+        lines (): Iterable of strings, without newline characters.
+        file (): Where to print to. Pass None to use sys.stdout.
+    """
+    Write("".join(f"{line}\n" for line in lines), file)
 
 
-def PrintDepth(depth=0, tab="    "):
+def PrintDepth(depth=0, tab="    ", file=None):
     """Prints the specified number of tabs
 
     Args:
         depth (): The number of tabs to print
         tab (): The characters to print per tab
+        file (): Where to print to. Pass None to use sys.stdout.
     """
-    print(depth * tab, end="")
+    Write(depth * tab, file)
+
+
+def RenderComment(comment, depth=0, tab=None, comment_operator="# "):
+    """Creates the text that PrintComment prints.
+
+    Args:
+        comment (): A string, or a list of strings where each is a line. Items that are not strings are skipped.
+        depth (): The number of tabs before each line.
+        tab (): The characters per tab. Pass None to use four spaces.
+        comment_operator (): The text placed before each line, after the tabs.
 
+    Returns: The comment, with a newline character at the end of every line.
 
-def PrintComment(comment, depth=0, tab=None, comment_operator="# "):
+    """
     if not isinstance(comment, list):
         comment = [comment]
-    # Each item in the list is a line
-    for line in comment:
-        # Only prints the comment if it is a string
-        if isinstance(line, str):
-            # Prints the necessary number of tabs
-            if tab is not None:
-                PrintDepth(depth, tab)
-            else:
-                PrintDepth(depth)
-            # Prints the actual comment text
-            print(f"{comment_operator}{line}")
+    if tab is None:
+        tab = "    "
+    indent = depth * tab
+    # Each item in the list is a line. Only strings are included.
+    return "".join(
+        f"{indent}{comment_operator}{line}\n" for line in comment if isinstance(line, str)
+    )
 
 
-def PrintHeaderWhale(author, date):
+def PrintComment(comment, depth=0, tab=None, comment_operator="# ", file=None):
+    Write(RenderComment(comment, depth, tab, comment_operator), file)
+
+
+def RenderHeaderWhale(author, date):
+    """Creates the text that PrintHeaderWhale prints.
+
+    Returns: The whale header comment as a single string.
+
+    """
     author_string = f"  Author: {author}"
     if len(author_string) < 36:
         author_string = (
-            author_string + "".zfill(35 - len(author_string)).replace("0", " ") + "."
+            author_string + StringOfSpaces(35 - len(author_string)) + "."
         )
     date_string = f"  Date: {date}"
     if len(date_string) < 35:
         date_string = (
             date_string
-            + "".zfill(34 - len(date_string)).replace("0", " ")
+            + StringOfSpaces(34 - len(date_string))
             + '":"         __ __'
         )
 
@@ -62,16 +272,22 @@ def PrintHeaderWhale(author, date):
         "                               |  O       \\____/  |",
         "~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^",
     ]
-    PrintComment(whale)
+    return RenderComment(whale)
+
+
+def PrintHeaderWhale(author, date, file=None):
+    Write(RenderHeaderWhale(author, date), file)
 
 
-def CenterText(text, filler_character="-", width=80):
-    if len(text) >= width:
+def CenterText(text, filler_character="-", width=80, colored=False):
+    # Escape sequences take up no space when colored
+    text_length = VisibleLength(text) if colored else len(text)
+    if text_length >= width:
         return text
     suffix_length = (
-        width - len(text)
+        width - text_length
     ) // 2  # floor of half of space left after subtracting length of text
-    prefix_length = width - suffix_length - len(text)
+    prefix_length = width - suffix_length - text_length
 
     prefix = "".zfill(prefix_length).replace("0", filler_character)
     suffix = "".zfill(suffix_length).replace("0", filler_character)
@@ -83,7 +299,7 @@ def StringOfSpaces(num_spaces):
     """
     Returns a string of spaces, with length equal to spaces parameter
     """
-    return "".zfill(num_spaces).replace("0", " ")
+    return " " * num_spaces
 
 
 def PlaceString(string, length=None, start=0, place_into=None):
@@ -137,6 +353,106 @@ def PlaceString(string, length=None, start=0, place_into=None):
     return s
 
 
+class TextCanvas:
+
+    """ A mutable line of text that many strings can be placed into, before it is converted to a string once.
+
+    Placement follows the same rules as PlaceString, so placing a series of strings gives the same
+    result as chaining PlaceString calls, without rebuilding the whole string for every placement.
+
+    Attributes:
+        length: The fixed length of the line, or None to grow it as needed.
+        buffer: List of the characters in the line. None until the first placement.
+        failed: Whether a placement has failed. Once set, every placement fails and Render returns None.
+    """
+
+    __slots__ = ("length", "buffer", "failed")
+
+    def __init__(self, length=None):
+        """ Creates an empty canvas.
+
+        Args:
+            length: The total length of the line. The output is guaranteed to not be longer than this. Pass None to make the line as long as needed.
+        """
+
+        self.length = length
+        self.buffer = None
+        self.failed = False
+
+    def Place(self, string, start=0):
+        """ Places a string into the line, in the same way as PlaceString.
+
+        Args:
+            string: The text to place.
+            start: The index to start the string at. Negative values count back from the end of the line.
+
+        Returns: True on success, False if the string would not fit within the line.
+        """
+
+        if self.failed:
+            return False
+
+        buffer = self.buffer
+        length = self.length
+        if length is None:
+            length = len(string) + start
+            if buffer is not None:
+                length = max(len(buffer), length)
+
+        # Calculates the positive index when a negative index is passed.
+        if start < 0:
+            start = length + start
+
+        # Post-placement string would exceed the defined length
+        if len(string) + start > length:
+            self.failed = True
+            return False
+
+        if buffer is None:
+            buffer = [" "] * length
+            self.buffer = buffer
+        elif len(buffer) > length:
+            self.failed = True
+            return False
+        elif len(buffer) < length:
+            buffer.extend(" " * (length - len(buffer)))
+
+        end = start + len(string)
+        if start >= 0:
+            buffer[start:end] = string
+        else:
+            # Matches the slicing PlaceString does when start is still negative
+            buffer[:] = buffer[:start] + list(string) + buffer[end:]
+        return True
+
+    def PlaceAll(self, strings):
+        """ Places a series of strings.
+
+        Args:
+            strings: Iterable of tuples of (text,index).
+
+        Returns: True if every placement succeeded, otherwise False.
+        """
+
+        for text, start in strings:
+            if not self.Place(text, start):
+                return False
+        return True
+
+    def Render(self):
+        """ Converts the line to a string.
+
+        Returns: The string, or None if nothing was placed or a placement failed.
+        """
+
+        if self.failed or self.buffer is None:
+            return None
+        return "".join(self.buffer)
+
+    def __str__(self):
+        return self.Render() or ""
+
+
 def CombineStrings(strings, length=None):
     """Combines a list of strings into a single string. Will be as long as necessary or can be capped to a set length
 
@@ -147,111 +463,373 @@ def CombineStrings(strings, length=None):
     Returns: None on failure, output string on success
 
     """
-    result_string = None
-    for string in strings:
-        text, start = string
-        result_string = PlaceString(text, length, start, result_string)
-        # Failure from PlaceString
-        if result_string is None:
-            return None
-    return result_string
+    canvas = TextCanvas(length)
+    canvas.PlaceAll(strings)
+    return canvas.Render()
 
 
-def BreakUpString(string, line_length):
-    """Breaks up a string into a list of lines, each line at max line_length long
+# Longest string whose visible length is cached. Longer strings are rarely measured twice.
+VISIBLE_CACHE_LIMIT = 256
+
+
+def VisibleLength(text):
+    """Finds the number of characters of text that are displayed, not counting ANSI escape sequences.
+    Results for short strings are cached, so repeated measurements of the same string are free.
 
     Args:
-        string (): The string to be broken up. Use '\n' within the string to force line breaks.
+        text (): The string to measure.
+
+    Returns: The visible length.
+
+    """
+    if "\033" not in text:
+        return len(text)
+    if len(text) > VISIBLE_CACHE_LIMIT:
+        return MeasureVisible(text)
+    return CachedVisibleLength(text)
+
+
+def MeasureVisible(text):
+    """Uncached version of VisibleLength, for text that contains escape sequences."""
+    return len(text) - sum(len(match) for match in ANSI_PATTERN.findall(text))
+
+
+CachedVisibleLength = functools.lru_cache(maxsize=1 << 16)(MeasureVisible)
+
+
+def SplitVisible(text, length):
+    """Splits a string after a number of visible characters, keeping escape sequences intact.
+
+    Args:
+        text (): The string to split.
+        length (): Number of visible characters to place in the first part.
+
+    Returns: Tuple of (first part, rest). Escape sequences directly after the split point stay with the rest.
+
+    """
+    if "\033" not in text:
+        return (text[:length], text[length:])
+
+    visible = 0
+    position = 0
+    for match in ANSI_PATTERN.finditer(text):
+        gap = match.start() - position
+        if visible + gap >= length:
+            break
+        visible += gap
+        position = match.end()
+    end = position + (length - visible)
+    return (text[:end], text[end:])
+
+
+def SplitVisibleEvery(text, length):
+    """Splits a string into pieces of length visible characters, keeping escape sequences intact.
+    The string is walked once, and escape sequences directly after a split point stay with the
+    following piece, the same as SplitVisible.
+
+    Returns: Tuple of (list of pieces, rest), in the same form as SplitEvery.
+
+    """
+    if "\033" not in text:
+        return SplitEvery(text, length)
+
+    cuts = []  # Offsets of the split points
+    visible = 0  # Visible characters before position
+    position = 0  # End of the last escape sequence
+    target = length  # Visible characters before the next split point
+    for start, end in itertools.chain(
+        (match.span() for match in ANSI_PATTERN.finditer(text)), ((len(text), len(text)),)
+    ):
+        gap = start - position
+        while visible + gap >= target:
+            cuts.append(position + (target - visible))
+            target += length
+        visible += gap
+        position = end
+
+    # Only splits while more than length visible characters remain, so the rest is never empty
+    del cuts[max(visible - 1, 0) // length :]
+    starts = [0, *cuts]
+    return ([text[a:b] for a, b in zip(starts, cuts)], text[starts[-1] :])
+
+
+def ContinueColors(lines):
+    """Closes colors that are still active at the end of a line, and reopens them at the start of the next.
+
+    Args:
+        lines (): Iterable of lines, each ending with a newline character.
+
+    Returns: Generator of the adjusted lines.
+
+    """
+    # Active sequences in the order they were last applied. Repeats are kept once, so the
+    # sequences reopened on each line stay bounded however many times a color is set.
+    active = {}
+    opened = ""
+    for line in lines:
+        if "\033" in line:
+            for sequence in ANSI_PATTERN.findall(line):
+                if sequence in ANSI_RESETS:
+                    active.clear()
+                elif sequence.endswith("m"):
+                    active.pop(sequence, None)
+                    active[sequence] = True
+        if opened:
+            line = opened + line
+        if active:
+            line = f"{line[:-1]}{ANSI_RESET}\n" if line.endswith("\n") else line + ANSI_RESET
+        opened = "".join(active)
+        yield line
+
+
+def WrapLines(source, line_length, colored=False):
+    """Lazily breaks up text into lines, each line at max line_length long. Produces exactly the
+    same lines as BreakUpString, in linear time and constant memory.
+
+    Args:
+        source (): The text to be broken up. Either a string, or any iterable of strings (such as a
+            file opened in text mode). Chunks may end in the middle of a line or word. Use '\n'
+            within the text to force line breaks.
         line_length (): The max length of any given line.
+        colored (): Pass True if the text contains ANSI escape sequences. Lengths are then measured
+            by visible characters, escape sequences never count as words, and a color that is active
+            at the end of a line is closed there and reopened on the next line.
 
-    Returns: A list of lines, with no newline characters in it. Each element is a single line.
+    Returns: Generator of lines, each ending with a newline character.
 
     """
-    # Splits the string into a list, separating at newlines already present (ends of paragraphs)
-    string = string.splitlines()
-    tempstr = ""  # Stores the working string while it is being built up
-    checkstr = ""  # Used for checking if adding the next word will push the string over the length limit
-    tabulatedList = []  # A list comprised of each finished line
-    for item in string:
-        item = (
-            item.split()
-        )  # Splits the paragraphs up by words. Separating at every space
-        for word in item:  # Loops through every word
-            # If the word is longer than the amount of space for a single line
-            if len(word) > line_length:
-                # Finishes the work in progress line
-                tabulatedList.append(f"{checkstr}\n")
-                tempstr = ""
-                checkstr = ""
-
-                # Used to split the long word (typically links) into multiple lines
-                workingWord = word
-
-                # Splits word into line_length sized lines
-                while len(workingWord) > line_length:
-                    tabulatedList.append(f"{workingWord[:line_length]}\n")
-                    workingWord = workingWord[line_length:]
-
-                # Gives the end of the word (the part less than line_length length) its own line
-                tabulatedList.append(f"{workingWord}\n")
-                continue
+    if colored:
+        return ContinueColors(WrapMeasuredLines(source, line_length, VisibleLength, SplitVisibleEvery))
+    return WrapMeasuredLines(source, line_length)
+
 
-            # For normal words
-            checkstr = checkstr + word
+def SplitEvery(text, length):
+    """Splits a string into pieces of length characters by walking offsets, so the rest of the string
+    is never copied more than once.
 
-            # simply adds new word to tempstr if it won't make it too long
-            if len(checkstr) < line_length:
-                tempstr = checkstr
-                tempstr = tempstr + " "
-                checkstr = tempstr
+    Args:
+        text (): The string to split.
+        length (): Number of characters in each piece.
 
-            # Adds word, then pushes line to list and starts new line
-            elif len(checkstr) == line_length:
-                tabulatedList.append(f"{checkstr}\n")
-                tempstr = ""
-                checkstr = ""
+    Returns: Tuple of (list of pieces, rest). The rest is the final 1 to length characters
+    (empty only if text is empty).
 
-            # Pushes current line to list, then starts a new line with word at the start
-            else:
-                tabulatedList.append(f"{tempstr}\n")
-                tempstr = word + " "
-                checkstr = tempstr
+    """
+    count = (len(text) - 1) // length if text else 0
+    end = count * length
+    return ([text[i : i + length] for i in range(0, end, length)], text[end:])
 
-        # Adds leftover words at the end of paragraph, so long as tempstr is not empty
-        if tempstr.strip():
-            tabulatedList.append(f"{tempstr}\n")
-            tempstr = ""
-            checkstr = ""
-    return tabulatedList
 
+def WrapMeasuredLines(source, line_length, measure=len, split=SplitEvery):
+    """The engine behind WrapLines, with the way text is measured and split left open.
 
-def Tabulate(string, terminal_width=80, spaces=8, prefix=None):
-    """Given a string, splits the string across enough lines, such that each line
+    Args:
+        source (): Same as WrapLines.
+        line_length (): The max length of any given line.
+        measure (): Function giving the length of a word.
+        split (): Function of (word, length) that splits a word into pieces of length, in the same
+            form as SplitEvery.
+
+    Returns: Generator of lines, each ending with a newline character.
+
+    """
+    if isinstance(source, str):
+        source = (source,)
+
+    # Words that measure zero (such as lone escape sequences) are joined to the next word
+    merge_empty = measure is not len
+    pending = ""
+
+    words = []  # Words of the line being built up
+    length = 0  # Length of the line being built up, counting a space after every word
+
+    def FinishLine():
+        nonlocal words, length
+        line = f"{' '.join(words)} \n" if words else "\n"
+        words = []
+        length = 0
+        return line
+
+    def SplitWord(word):
+        # Splits a long word (typically links) into line_length sized lines
+        heads, rest = split(word, line_length)
+        for head in heads:
+            yield f"{head}\n"
+        # Gives the end of the word (the part less than line_length length) its own line
+        yield f"{rest}\n"
+
+    def AddWord(word):
+        nonlocal words, length
+        # If the word is longer than the amount of space for a single line,
+        # finishes the work in progress line (even if empty) and splits the word.
+        word_length = measure(word)
+        if word_length > line_length:
+            yield FinishLine()
+            yield from SplitWord(word)
+            return
+
+        new_length = length + word_length
+        # Simply adds the word if it won't make the line too long
+        if new_length < line_length:
+            words.append(word)
+            length = new_length + 1
+
+        # Adds word, then finishes the line without a trailing space
+        elif new_length == line_length:
+            words.append(word)
+            yield f"{' '.join(words)}\n"
+            words = []
+            length = 0
+
+        # Finishes the current line, then starts a new line with word at the start
+        else:
+            yield FinishLine()
+            words = [word]
+            length = word_length + 1
+
+    carry = ""  # The end of the previous chunk, which may be the start of a word
+    long_word = False  # Whether carry is the remainder of a word that has already been split
+
+    for chunk in source:
+        if not chunk:
+            continue
+        segments = (carry + chunk).splitlines(keepends=True)
+        carry = ""
+        last = len(segments) - 1
+        for i, segment in enumerate(segments):
+            ends_paragraph = segment[-1] in LINE_BREAKS
+            segment_words = segment.split()
+
+            # The final word of the chunk may continue in the next chunk
+            partial = ""
+            if i == last and not segment[-1].isspace():
+                partial = segment_words.pop()
+
+            if merge_empty:
+                merged = []
+                for word in segment_words:
+                    if measure(word) == 0:
+                        pending += word
+                    else:
+                        merged.append(pending + word)
+                        pending = ""
+                segment_words = merged
+                if partial:
+                    partial = pending + partial
+                    pending = ""
+
+            for word in segment_words:
+                if long_word:
+                    yield from SplitWord(word)
+                    long_word = False
+                else:
+                    yield from AddWord(word)
+
+            # An escape sequence cut off by the end of the chunk is held back unmeasured, so it is
+            # never counted as visible or split, until the next chunk completes it
+            held = ""
+            if merge_empty and i == last:
+                start = partial.rfind("\033")
+                if start >= 0 and ANSI_PATTERN.match(partial, start) is None:
+                    partial, held = partial[:start], partial[start:]
+
+            # Emits the pieces of a long word that are already certain, so memory stays bounded
+            if measure(partial) > line_length:
+                if not long_word:
+                    yield FinishLine()
+                    long_word = True
+                heads, partial = split(partial, line_length)
+                for head in heads:
+                    yield f"{head}\n"
+            carry = partial + held
+
+            # Adds leftover words at the end of paragraph
+            if ends_paragraph and words:
+                if pending:
+                    words[-1] += pending
+                    pending = ""
+                yield FinishLine()
+
+    if carry:
+        if long_word:
+            yield f"{carry}\n"
+        else:
+            yield from AddWord(carry)
+    if words:
+        if pending:
+            words[-1] += pending
+        yield FinishLine()
+
+
+def BreakUpString(string, line_length, colored=False):
+    """Breaks up a string into a list of lines, each line at max line_length long
+
+    Args:
+        string (): The string to be broken up. Use '\n' within the string to force line breaks.
+        line_length (): The max length of any given line.
+        colored (): Pass True if the string contains ANSI escape sequences. See WrapLines.
+
+    Returns: A list of lines, with no newline characters in it. Each element is a single line.
+
+    """
+    return list(WrapLines(string, line_length, colored))
+
+
+def TabulateLines(source, terminal_width=80, spaces=8, prefix=None, colored=False):
+    """Lazy version of Tabulate. Joining the yielded lines gives exactly the output of Tabulate.
+
+    Given a string, splits the string across enough lines, such that each line
     will fit within the maximum terminal_width specified. Applies a prefix to every single line.
 
     Args:
-        string (): The string to be split across lines. Use '\n' within the string to force line breaks
+        source (): The string, or iterable of strings (such as a file opened in text mode), to be split across lines. Use '\n' within the string to force line breaks
         terminalWidth (): The maximum length of any line
         spaces (): The number of spaces to prefix each line with. Does nothing if prefix is set.
         prefix (): The string to prefix each line with. Overrides any value in spaces.
+        colored (): Pass True if the text contains ANSI escape sequences. See WrapLines.
 
-    Returns: A string with a newline '\n' character at the end of each line. When the string is printed, the lines will all be of length less than terminal_width
+    Returns: Generator of prefixed lines, each ending with a newline '\n' character.
 
     """
-    # Removes tabs from the original string
-    string = string.replace("\t", "")
-
     if prefix is not None:
-        spaces = len(prefix)
+        spaces = VisibleLength(prefix) if colored else len(prefix)
 
     line_length = (
         terminal_width - spaces
     )  # the number of non-space characters for the line
-    tabulatedList = BreakUpString(string, line_length)
 
     if prefix is None:
         prefix = StringOfSpaces(spaces)
-    return prefix + prefix.join(tabulatedList)  # Combines list into a single string
+
+    if isinstance(source, str):
+        source = (source,)
+
+    # Removes tabs from the original text
+    empty = True
+    for line in WrapLines((chunk.replace("\t", "") for chunk in source), line_length, colored):
+        empty = False
+        yield prefix + line
+
+    # Tabulate always begins with the prefix, even when there are no lines
+    if empty:
+        yield prefix
+
+
+def Tabulate(string, terminal_width=80, spaces=8, prefix=None, colored=False):
+    """Given a string, splits the string across enough lines, such that each line
+    will fit within the maximum terminal_width specified. Applies a prefix to every single line.
+
+    Args:
+        string (): The string to be split across lines. Use '\n' within the string to force line breaks
+        terminalWidth (): The maximum length of any line
+        spaces (): The number of spaces to prefix each line with. Does nothing if prefix is set.
+        prefix (): The string to prefix each line with. Overrides any value in spaces.
+        colored (): Pass True if the string contains ANSI escape sequences. See WrapLines.
+
+    Returns: A string with a newline '\n' character at the end of each line. When the string is printed, the lines will all be of length less than terminal_width
+
+    """
+    return "".join(TabulateLines(string, terminal_width, spaces, prefix, colored))
 
 
 def Enbox(
@@ -262,6 +840,7 @@ def Enbox(
     leftMargin=0,
     rightMargin=0,
     fancy=False,
+    colored=False,
 ):
     """
     Draws boxes around content. stringList is a list of strings of content. All entries in the list will be combined
@@ -269,28 +848,20 @@ def Enbox(
     Padding is the number of spaces between side walls and content.
     Margin is the number of spaces between the edge of terminal and the side walls.
     fancy is whether fancy characters will be used or basic characters.
+    colored is whether the content contains ANSI escape sequences (such as from ColoredText), which take up no space.
     """
     boxWidth = terminalWidth - (leftMargin + rightMargin)
     textBoxWidth = boxWidth - (leftPadding + rightPadding)
 
-    topLeft = "+"
-    topRight = "+"
-    bottomLeft = "+"
-    bottomRight = "+"
-    sideLeft = "+"
-    sideRight = "+"
-    vertical = "|"
-    horizontal = "-"
-
-    if fancy:
-        topLeft = "┌"
-        topRight = "┐"
-        bottomLeft = "└"
-        bottomRight = "┘"
-        sideLeft = "├"
-        sideRight = "┤"
-        vertical = "│"
-        horizontal = "─"
+    borders = FANCY_BORDERS if fancy else PLAIN_BORDERS
+    topLeft = borders["topLeft"]
+    topRight = borders["topRight"]
+    bottomLeft = borders["bottomLeft"]
+    bottomRight = borders["bottomRight"]
+    sideLeft = borders["sideLeft"]
+    sideRight = borders["sideRight"]
+    vertical = borders["vertical"]
+    horizontal = borders["horizontal"]
 
     s = []
 
@@ -307,10 +878,17 @@ def Enbox(
                 )
             else:
                 # Breaks the content into lines that will fit in the text box.
-                listStrings = Tabulate(item, textBoxWidth - 1, leftPadding).splitlines()
+                listStrings = Tabulate(
+                    item, textBoxWidth - 1, leftPadding, colored=colored
+                ).splitlines()
                 for line in listStrings:
                     # Adds the side walls and appends the line to the list of lines
-                    line = PlaceString(line, textBoxWidth, 0)
+                    if colored:
+                        # Pads by visible length, failing the same way as PlaceString when too long
+                        visible = VisibleLength(line)
+                        line = line + StringOfSpaces(textBoxWidth - visible) if visible <= textBoxWidth else None
+                    else:
+                        line = PlaceString(line, textBoxWidth, 0)
                     s.append(f"{vertical}{line}{vertical}")
 
     # Creates bottom line
@@ -320,7 +898,235 @@ def Enbox(
     return s
 
 
-def PrintHeaderComments(sections, comment_style="# "):
+class BoxPanel:
+
+    """ A box drawn with Enbox that is redrawn in place, rewriting only the lines that changed.
+
+    Lines are positioned with ANSI cursor-positioning escapes, so the panel is meant for a terminal.
+    Only the columns the panel occupies are written, so it can sit beside other content.
+
+    Attributes:
+        terminalWidth: Width of the box, passed to Enbox.
+        options: Additional keyword arguments passed to Enbox (padding, margins and fancy).
+        row: Terminal row of the top of the box. Rows start at 1.
+        column: Terminal column of the left side of the box. Columns start at 1.
+        file: Where to write to. None uses sys.stdout.
+        frame: The lines that are currently displayed.
+    """
+
+    def __init__(self, terminalWidth, row=1, column=1, file=None, **options):
+        """ Creates the panel. Nothing is drawn until Update is called.
+
+        Args:
+            terminalWidth: Width of the box, passed to Enbox.
+            row: Terminal row of the top of the box. Rows start at 1.
+            column: Terminal column of the left side of the box. Columns start at 1.
+            file: Where to write to. Pass None to use sys.stdout.
+            options: Keyword arguments for Enbox, such as leftPadding or fancy.
+        """
+
+        self.terminalWidth = terminalWidth
+        self.options = options
+        self.row = row
+        self.column = column
+        self.file = file
+        self.frame = []
+
+    def Update(self, stringList):
+        """ Draws the box for new content, writing only the lines that differ from the previous frame.
+
+        Args:
+            stringList: The content of the box, in the same form as for Enbox.
+
+        Returns: The number of lines written.
+        """
+
+        return self.Draw(Enbox(stringList, self.terminalWidth, **self.options))
+
+    def Draw(self, lines, force=False):
+        """ Displays a frame of already rendered lines.
+
+        Args:
+            lines: List of lines, without newline characters.
+            force: Pass True to rewrite every line, such as after the screen was cleared.
+
+        Returns: The number of lines written.
+        """
+
+        # Lines are only ever overwritten with spaces, never erased to the end of the terminal row,
+        # so content to the right of the panel is left alone
+        output = []
+        previous = self.frame
+        for i, line in enumerate(lines):
+            if force or i >= len(previous) or previous[i] != line:
+                # Moves the cursor to the line and writes it, covering any longer line it replaces
+                line_length = VisibleLength(line)
+                old_length = VisibleLength(previous[i]) if i < len(previous) else 0
+                output.append(
+                    f"\033[{self.row + i};{self.column}H{line}{StringOfSpaces(old_length - line_length)}"
+                )
+
+        # Blanks lines left over from a taller previous frame
+        for i in range(len(lines), len(previous)):
+            output.append(
+                f"\033[{self.row + i};{self.column}H{StringOfSpaces(VisibleLength(previous[i]))}"
+            )
+
+        self.frame = list(lines)
+        if output:
+            file = self.file if self.file is not None else sys.stdout
+            file.write("".join(output))
+            if hasattr(file, "flush"):
+                file.flush()
+        return len(output)
+
+    def Redraw(self):
+        """ Rewrites every line of the current frame.
+
+        Returns: The number of lines written.
+        """
+
+        return self.Draw(self.frame, force=True)
+
+
+def ColumnWidths(rows, available=None):
+    """Finds the width of each column of a table in a single pass over the rows.
+
+    Args:
+        rows (): Iterable of rows, where each row is a sequence of cells. Cells are converted with str().
+        available (): The total width the columns must fit within. The widest columns are narrowed
+            until they fit. Pass None to not limit the width.
+
+    Returns: List of column widths. Every width is at least 1.
+
+    """
+    widths = []
+    for row in rows:
+        for i, cell in enumerate(row):
+            cell_width = max((len(line) for line in str(cell).splitlines()), default=0)
+            if i >= len(widths):
+                widths.append(max(cell_width, 1))
+            elif cell_width > widths[i]:
+                widths[i] = cell_width
+
+    if available is not None and widths and sum(widths) > available:
+        # Finds the largest cap on column width that fits, so only the widest columns are narrowed
+        low, high = 1, max(widths)
+        while low < high:
+            cap = (low + high + 1) // 2
+            if sum(min(width, cap) for width in widths) <= available:
+                low = cap
+            else:
+                high = cap - 1
+        widths = [min(width, low) for width in widths]
+    return widths
+
+
+def TableLines(rows, terminalWidth=80, headers=None, widths=None, padding=1, fancy=False):
+    """Renders rows of cells as a table, one line at a time.
+
+    Cells that fit their column are used as-is. Longer cells are wrapped with WrapLines.
+
+    Args:
+        rows (): Iterable of rows, where each row is a sequence of cells. Cells are converted with str().
+            If widths is None, the rows are read twice, so a generator is first converted to a list.
+            Pass widths to stream rows without holding them in memory.
+        terminalWidth (): The total width of the table, used when calculating widths.
+        headers (): Optional sequence of column titles, drawn above a separator.
+        widths (): List of the width of each column, not counting padding. Pass None to calculate them with ColumnWidths.
+        padding (): Number of spaces on each side of the content of a cell.
+        fancy (): Whether to draw with the same fancy characters as Enbox, or basic characters.
+
+    Returns: Generator of the lines of the table, without newline characters.
+
+    Raises: ValueError if widths is given and a row (or headers) has more cells than widths has columns.
+
+    """
+    borders = FANCY_BORDERS if fancy else PLAIN_BORDERS
+    vertical = borders["vertical"]
+    horizontal = borders["horizontal"]
+
+    if widths is None:
+        if not isinstance(rows, (list, tuple)):
+            rows = list(rows)
+        columns = max((len(row) for row in rows), default=0)
+        if headers is not None:
+            columns = max(columns, len(headers))
+        available = terminalWidth - (columns + 1) - 2 * padding * columns
+        widths = ColumnWidths(
+            rows if headers is None else [headers, *rows], max(available, columns)
+        )
+
+    pad = StringOfSpaces(padding)
+    empty_cells = [StringOfSpaces(width) for width in widths]
+    separator = f"{pad}{vertical}{pad}"
+    start = f"{vertical}{pad}"
+    end = f"{pad}{vertical}"
+
+    def Border(left, join, right):
+        return left + join.join(horizontal * (width + 2 * padding) for width in widths) + right
+
+    def RowLines(row):
+        cells = [str(cell) for cell in row]
+        if len(cells) > len(widths):
+            raise ValueError(f"Row has {len(cells)} cells, but the table has {len(widths)} columns")
+        # Fast path: every cell fits on a single line
+        if all(
+            len(cell) <= width and "\n" not in cell and "\r" not in cell
+            for cell, width in zip(cells, widths)
+        ):
+            padded = [cell.ljust(width) for cell, width in zip(cells, widths)]
+            padded.extend(empty_cells[len(padded) :])
+            yield start + separator.join(padded) + end
+            return
+
+        wrapped = []
+        for cell, width in zip(cells, widths):
+            if len(cell) <= width and "\n" not in cell and "\r" not in cell:
+                wrapped.append([cell])
+            else:
+                wrapped.append([line.rstrip() for line in WrapLines(cell, width)] or [""])
+        height = max(len(lines) for lines in wrapped)
+        for i in range(height):
+            padded = [
+                (lines[i] if i < len(lines) else "").ljust(width)
+                for lines, width in zip(wrapped, widths)
+            ]
+            padded.extend(empty_cells[len(padded) :])
+            yield start + separator.join(padded) + end
+
+    yield Border(borders["topLeft"], borders["topJoin"], borders["topRight"])
+    if headers is not None:
+        yield from RowLines(headers)
+        yield Border(borders["sideLeft"], borders["cross"], borders["sideRight"])
+    for row in rows:
+        yield from RowLines(row)
+    yield Border(borders["bottomLeft"], borders["bottomJoin"], borders["bottomRight"])
+
+
+def PrintTable(rows, terminalWidth=80, headers=None, widths=None, padding=1, fancy=False, file=None):
+    """Prints a table from TableLines, writing the output in large chunks.
+
+    Args:
+        file (): Where to print to. Pass None to use sys.stdout. Other arguments are the same as TableLines.
+    """
+    if file is None:
+        file = sys.stdout
+    with OutputSink(file) as sink:
+        for line in TableLines(rows, terminalWidth, headers, widths, padding, fancy):
+            sink.write(f"{line}\n")
+
+
+def RenderHeaderComments(sections, comment_style="# "):
+    """Creates the text that PrintHeaderComments prints.
+
+    Args:
+        sections (): List of tuples of (type, text). type is one of 'regular', 'bullet' or 'bullet2'.
+        comment_style (): The text placed before each line.
+
+    Returns: The header comment as a single string, followed by an empty line.
+
+    """
     tab = 4
     lines = []
     for section in sections:
@@ -345,8 +1151,11 @@ def PrintHeaderComments(sections, comment_style="# "):
     lines += [
         "~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^~~^"
     ]
-    PrintComment(lines, comment_operator=comment_style)
-    print()
+    return RenderComment(lines, comment_operator=comment_style) + "\n"
+
+
+def PrintHeaderComments(sections, comment_style="# ", file=None):
+    Write(RenderHeaderComments(sections, comment_style), file)
 
 
 def FractionStrToNum(num):
@@ -421,3 +1230,81 @@ def FractionStrToNum(num):
 
     # Note that the False in the first element means success, and True indicates failure
     return (fail, temp_num)
+
+
+# Shapes of string that FractionStrToNumBatch converts without calling FractionStrToNum
+INT_PATTERN = re.compile(r"[+-]?[0-9]+")
+FLOAT_PATTERN = re.compile(
+    r"[+-]?(?:[0-9]+\.[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?|[+-]?[0-9]+[eE][+-]?[0-9]+"
+)
+FRACTION_PATTERN = re.compile(r"(?:([0-9]+)[- ])?([0-9]+)/([0-9]+)")
+
+
+def FractionStrToNumBatch(nums, as_numpy=None):
+    """Converts many strings to numbers, giving the same results as FractionStrToNum.
+
+    Plain integers, floats and fractions of the form y/z, x-y/z and x y/z are recognized with compiled
+    patterns. Anything else falls back to FractionStrToNum itself, so results always agree with it.
+
+    Args:
+        nums (): Sequence (or NumPy array) of strings to decode.
+        as_numpy (): Pass True to return NumPy arrays, which requires NumPy. Pass None to return NumPy
+            arrays only when nums is a NumPy array.
+
+    Returns: Tuple of (numbers, failures). numbers holds the decoded value (0 on failure) and failures
+    holds True where decoding failed. These are lists, or a float64 array and a bool array for NumPy.
+    Strings that would make FractionStrToNum raise (such as a zero denominator) count as failures.
+
+    """
+    numpy = None
+    if as_numpy or as_numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            if as_numpy:
+                raise
+    if as_numpy is None:
+        as_numpy = numpy is not None and isinstance(nums, numpy.ndarray)
+
+    int_match = INT_PATTERN.fullmatch
+    float_match = FLOAT_PATTERN.fullmatch
+    fraction_match = FRACTION_PATTERN.fullmatch
+
+    values = []
+    failures = []
+    for num in nums:
+        num = str(num).strip()
+        if int_match(num):
+            try:
+                values.append(int(num))
+                failures.append(False)
+                continue
+            except ValueError:
+                # Longer than int() allows, so handled the same way as FractionStrToNum does below
+                pass
+        if float_match(num):
+            values.append(float(num))
+            failures.append(False)
+            continue
+        match = fraction_match(num)
+        if match:
+            prefix, numerator, denominator = match.groups()
+            try:
+                denominator = int(denominator)
+                if denominator != 0:
+                    values.append(round(int(prefix or 0) + int(numerator) / denominator, 2))
+                    failures.append(False)
+                    continue
+            except (ValueError, ArithmeticError):
+                # Too many digits for int(), or too large to divide, so left to FractionStrToNum below
+                pass
+        try:
+            fail, value = FractionStrToNum(num)
+        except ArithmeticError:
+            fail, value = True, 0
+        values.append(value)
+        failures.append(fail)
+
+    if as_numpy:
+        return (numpy.asarray(values, dtype=numpy.float64), numpy.asarray(failures, dtype=bool))
+    return (values, failures)